@@ -13,7 +13,9 @@ setup(
         description=DESCRIPTION,
         long_description=LONG_DESCRIPTION,
         packages=find_packages(),
-        install_requires=['mwapi', 'mwviews'],
+        install_requires=['mwapi', 'aiohttp'],
+        extras_require={'arrays': ['numpy', 'pandas'], 'graphs': ['numpy', 'scipy'],
+                        'parquet': ['numpy', 'pandas', 'pyarrow']},
         keywords=['python', 'wikipedia', 'wikimedia', 'mediawiki', 'API', 'dump'],
         classifiers= [
             "Development Status :: 3 - Alpha",
@@ -1,6 +1,7 @@
 from .api import *
-# from .dumps import *
+from .dumps import *
 from .tools import *
+from .storage import *
 from .pageviews import *
 from .redirects import *
 from .revisions import *
@@ -1,10 +1,15 @@
 import requests
 import asyncio
 import aiohttp
+import time
+import random
+import datetime
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse, urlencode, quote
 import mwapi
 from mwapi.errors import APIError
-from mwviews.api import PageviewsClient
 from .tools import *
+from .storage import *
 
 def query(session, query_args):
     """Run a query to the MediaWiki API.
@@ -56,7 +61,112 @@ def query_continued(session, query_args, debug=False):
     continued = session.get(action='query', continuation=True, **query_args)
     yield from iterate_query(continued, debug)
 
-async def query_async(session, query_args, continuation=True, debug=False, httpmethod='GET', posturl=None):
+def normalise_params(params):
+    """Normalise query parameters to the string form sent to the MediaWiki API.
+
+    Args:
+        params (dict): The query parameters.
+
+    Returns:
+        dict: Normalised parameters. True becomes '', False and None are dropped, and lists are joined with '|'.
+    """
+    normal_params = {}
+    for k, v in params.items():
+        if isinstance(v, bool):
+            v = '' if v else None
+        elif (not isinstance(v, str)) and hasattr(v, '__iter__'):
+            v = '|'.join(str(x) for x in v)
+        if v is not None:
+            normal_params[k] = v
+    return normal_params
+
+def session_get(session, url=None, params=None):
+    """Open a GET request through an mwapi session's aiohttp connection pool, with the session's headers
+    and timeout. This is the only place that relies on the internals of mwapi.AsyncSession.
+
+    Args:
+        session (mwapi.AsyncSession): The mwapi session.
+        url (str, optional): The request URL. Defaults to None (the session's MediaWiki API, in its format version).
+        params (dict, optional): The request parameters. Defaults to None.
+
+    Returns:
+        aiohttp.ClientResponse: The response, as an async context manager.
+    """
+    if url is None:
+        url = session.api_url
+        params = dict(params or {}, format='json')
+        if session.formatversion is not None:
+            params['formatversion'] = session.formatversion
+    return session.session.get(url, params=params, headers=session.headers, timeout=session.timeout)
+
+async def mw_request(session, params):
+    """Send a single GET request to the MediaWiki API.
+
+    Args:
+        session (mwapi.AsyncSession): The mwapi session.
+        params (dict): The request parameters.
+
+    Raises:
+        aiohttp.ClientResponseError: If the server returns an HTTP error status.
+        APIError: If the API returns an error. The response headers are attached as error.headers.
+        ValueError: If the response cannot be decoded.
+
+    Returns:
+        dict: The JSON response document.
+    """
+    async with session_get(session, params=normalise_params(params)) as response:
+        response.raise_for_status()
+        try:
+            doc = await response.json(content_type=None)
+        except ValueError:
+            raise ValueError("Could not decode as JSON:\n{0}".format((await response.text())[:350]))
+        if 'error' in doc:
+            error = APIError.from_doc(doc['error'])
+            error.headers = response.headers
+            raise error
+    return doc
+
+async def post_request(session, url, json):
+    """Send a single POST request with a JSON body.
+
+    Args:
+        session (aiohttp.ClientSession): The aiohttp session.
+        url (str): The URL to post to.
+        json (dict): The request body.
+
+    Raises:
+        aiohttp.ClientResponseError: If the server is overloaded or rate limiting (HTTP 429 or 5xx).
+
+    Returns:
+        dict: The JSON response document.
+    """
+    async with session.post(url=url, json=json) as response:
+        if (response.status == 429) or (response.status >= 500):
+            response.raise_for_status()
+        return await response.json()
+
+async def rest_request(session, url):
+    """Send a single GET request to a Wikimedia REST API endpoint, through the mwapi session's connection pool.
+
+    Args:
+        session (mwapi.AsyncSession): The mwapi session.
+        url (str): The request URL.
+
+    Raises:
+        aiohttp.ClientResponseError: If the server returns an HTTP error status other than 404.
+
+    Returns:
+        dict: The JSON response document, or {} if nothing was found.
+    """
+    async with session_get(session, url) as response:
+        # Articles without any pageviews in the date range are not found
+        if response.status == 404:
+            return {}
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+async def query_async(session, query_args, continuation=True, debug=False, httpmethod='GET', posturl=None,
+                      scheduler=None, host=None):
     """Create an async query to the MediaWiki API.
 
     Args:
@@ -64,6 +174,9 @@ async def query_async(session, query_args, continuation=True, debug=False, httpm
         query_args (dict): The query arguments.
         continuation (bool, optional): Whether to use continuation. Defaults to True.
         debug (bool, optional): Whether to print debug output. Defaults to False.
+        scheduler (QueryScheduler, optional): Scheduler to limit concurrency and request rate, retry failed requests
+            and cache responses. Defaults to None.
+        host (str, optional): Host the request budget is charged to. Defaults to None.
 
     Raises:
         ValueError: Error returned by API.
@@ -71,47 +184,108 @@ async def query_async(session, query_args, continuation=True, debug=False, httpm
     Returns:
         list: List of pages returned by API.
     """
-    # Perform the initial query
-    if httpmethod == 'GET':
-        continued = await asyncio.create_task(session.get(action='query',
-                                                        continuation=continuation,
-                                                        **query_args))
-    elif httpmethod == 'POST':
-        async with session.post(url=posturl, json=query_args) as response:
-            continued = await response.json()
-        return continued
-    else:
+    if httpmethod not in ['GET', 'POST']:
         raise ValueError("Invalid HTTP method.")
-    
-    # Check if continuation is False
-    if not continuation:
-        if debug:
-            return continued
-        elif 'query' in continued:
-            return continued['query']['pages']
+
+    cache = scheduler.cache if scheduler is not None else None
+
+    async def send(request, params):
+        # Look the request up in the response cache first
+        if cache is not None:
+            ckey = cache.key(host, httpmethod, posturl, params)
+            hit, doc = cache.get(ckey)
+            if hit:
+                return doc
+        # Send a request within the rate budget, retrying with backoff if the scheduler has a retry policy.
+        # The retry policy throttles each attempt itself.
+        if (scheduler is None) or (scheduler.retry is None):
+            if scheduler is not None:
+                await scheduler.throttle(host)
+            doc = await request()
         else:
-            print("MediaWiki returned empty result batch.")
-            return None
-    
-    pages = []
+            doc = await scheduler.retry.run(request, key=query_args, scheduler=scheduler, host=host)
+        if cache is not None:
+            cache.set(ckey, doc, cache.ttl(params) if httpmethod == 'GET' else cache.ttls['default'])
+        return doc
+
+    # Wait for a free request slot
+    if scheduler is not None:
+        await scheduler.acquire()
     try:
-        # Iterate through the continued query
-        async for portion in continued:
-            if debug:
-                pages.append(portion)
-            elif 'query' in portion:
-                for page in portion['query']['pages']:
-                    pages.append(page)
-            else:
-                print("MediaWiki returned empty result batch.")
-    except APIError as error:
-        raise ValueError("MediaWiki returned an error:", str(error))
-    except ValueError as error:
-        raise ValueError("MediaWiki returned an error:", str(error))
-    
-    return pages
+        if httpmethod == 'POST':
+            return await send(lambda: post_request(session, posturl, query_args), query_args)
 
-async def iterate_async_query(session, query_args_list, function=None, f_args=[], continuation=True, debug=False, httpmethod='GET', posturl=None):
+        params = {'action': 'query', **query_args}
+        if continuation:
+            params['continue'] = ''
+
+        pages = []
+        try:
+            while True:
+                # Perform the query, continuing from the last portion if necessary
+                request_params = normalise_params(params)
+                portion = await send(lambda: mw_request(session, request_params), request_params)
+
+                # Check if continuation is False
+                if not continuation:
+                    if debug:
+                        return portion
+                    elif 'query' in portion:
+                        return portion['query']['pages']
+                    else:
+                        print("MediaWiki returned empty result batch.")
+                        return None
+
+                if debug:
+                    pages.append(portion)
+                elif 'query' in portion:
+                    for page in portion['query']['pages']:
+                        pages.append(page)
+                else:
+                    print("MediaWiki returned empty result batch.")
+
+                if 'continue' not in portion:
+                    break
+                params.update(portion['continue'])
+        except APIError as error:
+            raise ValueError("MediaWiki returned an error:", str(error))
+        except ValueError as error:
+            raise ValueError("MediaWiki returned an error:", str(error))
+        
+        return pages
+    finally:
+        if scheduler is not None:
+            scheduler.release()
+
+def query_task_factory(session, function=None, f_args=[], continuation=True, debug=False,
+                       httpmethod='GET', posturl=None, scheduler=None):
+    """Create a function that builds the (optionally parsed) query coroutine for a set of query arguments.
+
+    Args:
+        session (wikitoolkit.WTSession.session): The wikitoolkit session.
+        function (function, optional): Function to parse API output. Defaults to None.
+        f_args (dict, optional): Arguments for parsing function. Defaults to [].
+        continuation (bool, optional): Whether to use continuation. Defaults to True.
+        debug (bool, optional): Whether to print debug output. Defaults to False.
+        scheduler (QueryScheduler, optional): Scheduler to limit concurrency and request rate. Defaults to None.
+
+    Returns:
+        function: Function taking query arguments and returning a coroutine.
+    """
+    host = session_host(session)
+
+    def make_task(query_args):
+        # Create the task for a single query
+        data = query_async(session, query_args, continuation, debug, httpmethod, posturl,
+                           scheduler, host)
+        if function:
+            return function(data, *f_args)
+        return data
+
+    return make_task
+
+async def iterate_async_query(session, query_args_list, function=None, f_args=[], continuation=True, debug=False, httpmethod='GET', posturl=None,
+                              scheduler=None):
     """Iterate through a list of queries asynchronously.
 
     Args:
@@ -121,22 +295,52 @@ async def iterate_async_query(session, query_args_list, function=None, f_args=[]
         f_args (dict, optional): Arguments for parsing function. Defaults to [].
         continuation (bool, optional): Whether to use continuation. Defaults to True.
         debug (bool, optional): Whether to print debug output. Defaults to False.
+        scheduler (QueryScheduler, optional): Scheduler to limit concurrency and request rate.
+            Defaults to None (all queries are run at once).
 
     Returns:
         list: List of results from queries
     """
-    # Create a list of tasks to be executed asynchronously
-    if function:
-        tasks = [function(query_async(session, query_args, continuation, debug, httpmethod, posturl), *f_args)
-                  for query_args in query_args_list]    
-    else:
-        tasks = [query_async(session, query_args, continuation, debug, httpmethod, posturl) for query_args in query_args_list]
-    
-    # Execute the tasks asynchronously and gather the results
-    results = await asyncio.gather(*tasks)
+    make_task = query_task_factory(session, function, f_args, continuation, debug,
+                                   httpmethod, posturl, scheduler)
+
+    # Without a scheduler, execute all of the tasks at once and gather the results
+    if scheduler is None:
+        return await asyncio.gather(*[make_task(query_args) for query_args in query_args_list])
+
+    # Otherwise let the scheduler create tasks as slots become free
+    results = await scheduler.map(make_task, query_args_list)
 
     return results
 
+async def aiter_async_query(session, query_args_list, function=None, f_args=[], continuation=True, debug=False, httpmethod='GET', posturl=None,
+                            scheduler=None, ordered=False):
+    """Iterate through a list of queries asynchronously, yielding each result as soon as it is ready.
+    Only a bounded number of queries are in flight at once, so results can be consumed with flat memory use.
+
+    Args:
+        session (wikitoolkit.WTSession.session): The wikitoolkit session.
+        query_args_list (iterable): Queries to run. May be a generator.
+        function (function, optional): Function to parse API output. Defaults to None.
+        f_args (dict, optional): Arguments for parsing function. Defaults to [].
+        continuation (bool, optional): Whether to use continuation. Defaults to True.
+        debug (bool, optional): Whether to print debug output. Defaults to False.
+        scheduler (QueryScheduler, optional): Scheduler to limit concurrency and request rate.
+            Defaults to None (a default QueryScheduler).
+        ordered (bool, optional): Whether to yield results in submission order rather than
+            completion order. Defaults to False.
+
+    Yields:
+        Result of each query.
+    """
+    if scheduler is None:
+        scheduler = QueryScheduler()
+    make_task = query_task_factory(session, function, f_args, continuation, debug,
+                                   httpmethod, posturl, scheduler)
+
+    async for i, result in scheduler.imap(make_task, query_args_list, ordered=ordered):
+        yield result
+
 def query_static(request, lang='en'):
     """
     Query the Wikipedia API with specified parameters.
@@ -232,8 +436,11 @@ def qores(revid, lang='enwiki', model=''):
     return result
 
 
+# Maximum length of the query string sent to the API, to stay within server URL limits
+MAX_QUERY_LENGTH = 7000
+
 def querylister(titles=None, pageids=None, revids=None, generator=False,
-                pagemaps=None, params={}):
+                pagemaps=None, params={}, chunksize=None, max_length=MAX_QUERY_LENGTH):
     """Creates a list of queries for the Wikipedia API. Normalises and redirects article titles or pageids.
 
     Args:
@@ -243,6 +450,8 @@ def querylister(titles=None, pageids=None, revids=None, generator=False,
         generator (bool, optional): Whether to use API generator option. Defaults to False.
         pagemaps (PageMaps, optional): The PageMaps object to map redirects with. Defaults to None.
         params (dict, optional): Query parameters. Defaults to {}.
+        chunksize (int, optional): Maximum number of titles/IDs per query, e.g. from WTSession.get_title_limit. Defaults to None (1 for generator queries, otherwise 50).
+        max_length (int, optional): Maximum length of each query string. Queries are given fewer titles/IDs to stay within it. Defaults to MAX_QUERY_LENGTH.
 
     Raises:
         ValueError: Must specify exactly one of titles, pageids or revids
@@ -255,26 +464,31 @@ def querylister(titles=None, pageids=None, revids=None, generator=False,
         raise ValueError('Must specify exactly one of titles, pageids or revids')
     
     # Determine the chunk size based on the generator flag
-    if generator:
+    if chunksize:
+        cs = chunksize
+    elif generator:
         cs = 1
     else:
         cs = 50
 
+    # Leave room for the other query parameters in the query string
+    budget = max_length - len(urlencode(normalise_params(params))) - 100
+
     if titles is not None:
         # Process article titles and handle redirects
         titles = process_articles(titles=titles, pagemaps=pagemaps)
-        tar_chunks = list(chunks(list(set(titles)), cs))
+        tar_chunks = list(length_chunks(list(set(titles)), cs, budget))
         key = 'titles'
         ix = 1
     elif pageids is not None:
         # Process page IDs and handle redirects
         pageids = process_articles(pageids=pageids, pagemaps=pagemaps)
-        tar_chunks = list(chunks([str(x) for x in set(pageids)], cs))
+        tar_chunks = list(length_chunks([str(x) for x in set(pageids)], cs, budget))
         key = 'pageids'
         ix = 0
     else:
         # Process revision IDs
-        tar_chunks = list(chunks([str(x) for x in set(revids)], cs))
+        tar_chunks = list(length_chunks([str(x) for x in set(revids)], cs, budget))
         key = 'revids'
         ix = -1
     
@@ -284,6 +498,575 @@ def querylister(titles=None, pageids=None, revids=None, generator=False,
     
     return query_args_list, key, ix
 
+def session_host(session):
+    """Get the host a session sends its requests to.
+
+    Args:
+        session (mwapi.AsyncSession|aiohttp.ClientSession): The session.
+
+    Returns:
+        str: The host name, or None if it cannot be determined.
+    """
+    host = getattr(session, 'host', None) or getattr(session, '_base_url', None)
+    if host is None:
+        return None
+    return urlparse(str(host)).netloc or str(host)
+
+class RateBudget:
+    """Token bucket limiting the request rate to a single host.
+
+    Args:
+        rate (float): Maximum sustained requests per second.
+        burst (int, optional): Maximum number of requests that can be made at once. Defaults to None (the rate, rounded up).
+    """
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1, int(rate + 0.999))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a request can be made within the budget."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated)*self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens)/self.rate)
+
+class RetryPolicy:
+    """Retry engine for API requests. Classifies errors, backs off exponentially with jitter
+    without blocking the event loop, honours Retry-After headers, and counts the errors of each
+    kind and the retries made for each request in flight.
+
+    Args:
+        max_retries (int, optional): Maximum number of retries per request. Defaults to 5.
+        base_delay (float, optional): Delay before the first retry, in seconds. Defaults to 1.
+        max_delay (float, optional): Maximum delay between retries, in seconds. Defaults to 60.
+        retry_codes (list, optional): MediaWiki API error codes to retry. Defaults to ['maxlag', 'ratelimited'].
+        retry_statuses (list, optional): HTTP status codes to retry. Defaults to [429, 502, 503, 504].
+    """
+    def __init__(self, max_retries=5, base_delay=1, max_delay=60,
+                 retry_codes=['maxlag', 'ratelimited'], retry_statuses=[429, 502, 503, 504]):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_codes = list(retry_codes)
+        self.retry_statuses = list(retry_statuses)
+        self.retry_counts = {}
+        self.error_counts = {}
+
+    def classify(self, error):
+        """Classify an error raised by a request.
+
+        Args:
+            error (Exception): The error.
+
+        Returns:
+            str: The kind of error (an API error code, 'http<status>' or 'connection'), or None if it should not be retried.
+        """
+        if isinstance(error, APIError):
+            return error.code if error.code in self.retry_codes else None
+        if isinstance(error, aiohttp.ClientResponseError):
+            return 'http%d' % error.status if error.status in self.retry_statuses else None
+        if isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                              ConnectionError, asyncio.TimeoutError)):
+            return 'connection'
+        return None
+
+    def retry_after(self, error):
+        """Get the delay requested by the server's Retry-After header, if any.
+
+        Args:
+            error (Exception): The error.
+
+        Returns:
+            float: The requested delay in seconds, or None.
+        """
+        headers = getattr(error, 'headers', None)
+        if not headers or ('Retry-After' not in headers):
+            return None
+        value = headers['Retry-After']
+        try:
+            return max(0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def delay(self, attempt, error=None):
+        """Get the time to wait before a retry.
+
+        Args:
+            attempt (int): The number of retries already made.
+            error (Exception, optional): The error that caused the retry. Defaults to None.
+
+        Returns:
+            float: The delay in seconds.
+        """
+        # Full jitter exponential backoff, at least as long as the server asked for
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        retry_after = self.retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return retry_after + backoff/10
+        return backoff
+
+    async def run(self, request, key=None, scheduler=None, host=None):
+        """Run a request, retrying if it fails with a retryable error. Every attempt waits for the
+        host's rate budget, so retries stay within the rate limit.
+
+        Args:
+            request (function): Function returning a coroutine for the request.
+            key (dict|str, optional): The query arguments or URL identifying the request, for retry counts. Defaults to None.
+            scheduler (QueryScheduler, optional): Scheduler to throttle each attempt with and to pause the host on
+              rate limiting. Defaults to None.
+            host (str, optional): The host the request is sent to. Defaults to None.
+
+        Returns:
+            The result of the request.
+        """
+        rkey = None
+        if key is not None:
+            rkey = tuple(sorted((k, str(v)) for k, v in key.items())) if isinstance(key, dict) else key
+        attempt = 0
+        try:
+            while True:
+                if scheduler is not None:
+                    await scheduler.throttle(host)
+                try:
+                    return await request()
+                except Exception as error:
+                    kind = self.classify(error)
+                    if (kind is None) or (attempt >= self.max_retries):
+                        raise
+                    self.error_counts[kind] = self.error_counts.get(kind, 0) + 1
+                    wait = self.delay(attempt, error)
+                    # Back off the whole host if the server is rate limiting or overloaded
+                    if (scheduler is not None) and (kind != 'connection'):
+                        scheduler.pause(host, wait)
+                    attempt += 1
+                    if rkey is not None:
+                        self.retry_counts[rkey] = attempt
+                    await asyncio.sleep(wait)
+        finally:
+            # Only requests still in flight are counted, so the counts don't grow over a long crawl
+            if rkey is not None:
+                self.retry_counts.pop(rkey, None)
+
+class QueryScheduler:
+    """Bounded-concurrency scheduler for API queries. Limits the number of requests
+    in flight, applies per-host request-rate budgets, and only creates new query
+    tasks as earlier ones finish.
+
+    Args:
+        max_concurrent (int, optional): Maximum number of requests in flight at once. Defaults to 50.
+        rate_limits (dict, optional): Maximum requests per second for each host, e.g. {'en.wikipedia.org': 50}. Defaults to {}.
+        default_rate (float, optional): Maximum requests per second for hosts not in rate_limits. Defaults to None (unlimited).
+        retry (RetryPolicy, optional): Policy for retrying failed requests. Defaults to None (a default RetryPolicy).
+        cache (ResponseCache, optional): Cache to look responses up in before sending requests. Defaults to None (no caching).
+    """
+    def __init__(self, max_concurrent=50, rate_limits={}, default_rate=None, retry=None, cache=None):
+        if max_concurrent < 1:
+            raise ValueError('max_concurrent must be at least 1')
+        self.max_concurrent = max_concurrent
+        self.rate_limits = {urlparse(k).netloc or k: v for k, v in rate_limits.items()}
+        self.default_rate = default_rate
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.cache = cache
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.budgets = {}
+        self.paused_until = {}
+
+    def budget(self, host):
+        """Get the request-rate budget for a host.
+
+        Args:
+            host (str): The host name.
+
+        Returns:
+            RateBudget: The budget, or None if the host is unlimited.
+        """
+        if host not in self.budgets:
+            rate = self.rate_limits.get(host, self.default_rate)
+            self.budgets[host] = RateBudget(rate) if rate else None
+        return self.budgets[host]
+
+    def pause(self, host, delay):
+        """Hold back all new requests to a host, e.g. when it is rate limiting.
+
+        Args:
+            host (str): The host name.
+            delay (float): How long to pause for, in seconds.
+        """
+        self.paused_until[host] = max(self.paused_until.get(host, 0), time.monotonic() + delay)
+
+    async def throttle(self, host=None):
+        """Wait until the host's request-rate budget allows another request.
+
+        Args:
+            host (str, optional): The host name. Defaults to None.
+        """
+        wait = self.paused_until.get(host, 0) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        budget = self.budget(host)
+        if budget is not None:
+            await budget.acquire()
+
+    async def acquire(self, host=None):
+        """Wait for a free request slot and, if a host is given, the host's rate budget.
+
+        Args:
+            host (str, optional): The host name. Defaults to None.
+        """
+        await self.semaphore.acquire()
+        try:
+            if host is not None:
+                await self.throttle(host)
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    def release(self):
+        """Free a request slot."""
+        self.semaphore.release()
+
+    async def imap(self, function, iterable, ordered=False):
+        """Run a coroutine function over an iterable, keeping at most max_concurrent
+        tasks alive. New tasks are only created as running ones complete.
+
+        Args:
+            function (function): Function returning a coroutine for each item.
+            iterable (iterable): The items to run the function on.
+            ordered (bool, optional): Whether to yield results in submission order rather than
+                completion order. Defaults to False.
+
+        Yields:
+            tuple: Index of the item and its result.
+        """
+        items = enumerate(iterable)
+        pending = {}
+        finished = {}
+        next_ix = 0
+        exhausted = False
+        try:
+            while True:
+                # Top up the running tasks. In submission order, don't run further ahead of the
+                # next result to yield than the concurrency limit, so the buffer stays bounded.
+                while (not exhausted) and (len(pending) < self.max_concurrent):
+                    if ordered and (len(pending) + len(finished) >= self.max_concurrent):
+                        break
+                    try:
+                        i, item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending[asyncio.ensure_future(function(item))] = i
+                if not pending:
+                    break
+                # Wait for at least one task to finish before creating more
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i = pending.pop(task)
+                    if not ordered:
+                        yield i, task.result()
+                    else:
+                        finished[i] = task.result()
+                while next_ix in finished:
+                    yield next_ix, finished.pop(next_ix)
+                    next_ix += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def map(self, function, iterable):
+        """Run a coroutine function over an iterable, keeping at most max_concurrent
+        tasks alive. New tasks are only created as running ones complete.
+
+        Args:
+            function (function): Function returning a coroutine for each item.
+            iterable (iterable): The items to run the function on.
+
+        Returns:
+            list: Results in the same order as the items.
+        """
+        results = {}
+        async for i, result in self.imap(function, iterable):
+            results[i] = result
+
+        return [results[i] for i in range(len(results))]
+
+PAGEVIEWS_URL = 'https://wikimedia.org/api/rest_v1/metrics/pageviews'
+
+def pv_parse_date(date):
+    """Parse a pageviews API date.
+
+    Args:
+        date (str|date): A date object or string in YYYYMMDD(HH) format.
+
+    Returns:
+        datetime.datetime: The date.
+    """
+    if isinstance(date, datetime.datetime):
+        return date
+    if isinstance(date, datetime.date):
+        return datetime.datetime(date.year, date.month, date.day)
+    return datetime.datetime.strptime(str(date).ljust(10, '0'), '%Y%m%d%H')
+
+def pv_format_date(date):
+    """Format a date for the pageviews API.
+
+    Args:
+        date (datetime.datetime): The date.
+
+    Returns:
+        str: The date in YYYYMMDDHH format.
+    """
+    return date.strftime('%Y%m%d%H')
+
+def pageviews_ttl(cache, end, lag=3):
+    """Get the time to live for cached pageviews ending on a given date.
+
+    Args:
+        cache (ResponseCache): The response cache.
+        end (str|date): The end date of the pageviews. None means today.
+        lag (int, optional): Number of days after which pageviews are taken to be published and final. Defaults to 3.
+
+    Returns:
+        float: The time to live in seconds, or None if the pageviews never change.
+    """
+    if end is None:
+        return cache.ttls['pageviews_recent']
+    # Pageviews for recent days may not be published yet, so only older days are final
+    if pv_parse_date(end).date() < datetime.date.today() - datetime.timedelta(days=lag):
+        return cache.ttls['pageviews']
+    return cache.ttls['pageviews_recent']
+
+def pv_dates(start, end, granularity='daily'):
+    """Get the dates of the pageviews in a date range.
+
+    Args:
+        start (datetime.datetime): The start date.
+        end (datetime.datetime): The end date.
+        granularity (str, optional): hourly, daily or monthly counts. Defaults to 'daily'.
+
+    Returns:
+        list: The dates, in order.
+    """
+    step = datetime.timedelta(hours=1) if granularity == 'hourly' else datetime.timedelta(days=1)
+    dates = []
+    date = start
+    while date <= end:
+        dates.append(date)
+        date += step
+    if granularity == 'monthly':
+        dates = list(dict.fromkeys(datetime.datetime(d.year, d.month, 1) for d in dates))
+    return dates
+
+class AsyncPageviewsClient:
+    """Asynchronous client for the Wikimedia pageviews API. Requests share the mwapi session's connection
+    pool and go through the session's scheduler, so per-article requests run concurrently within its
+    concurrency and rate limits. Long date ranges are split into windows requested in parallel, and each
+    window is cached separately, so past windows are never requested again.
+
+    Args:
+        session (mwapi.AsyncSession): The mwapi session whose connection pool and headers are used.
+        scheduler (QueryScheduler, optional): Scheduler to limit concurrency and request rate and retry failed requests. Defaults to None.
+        cache (ResponseCache, optional): Cache to look responses up in before sending requests. Defaults to None.
+        window (int, optional): Maximum number of days requested at once for daily and hourly pageviews. Defaults to 366.
+        store (PageviewStore, optional): Store of pageview time series, so only the dates missing from it are requested. Defaults to None.
+        lag (int, optional): Number of days after which pageviews are taken to be published and cached permanently. Defaults to 3.
+    """
+    def __init__(self, session, scheduler=None, cache=None, window=366, store=None, lag=3):
+        self.session = session
+        self.scheduler = scheduler
+        self.cache = cache
+        self.window = window
+        self.store = store
+        self.lag = lag
+        self.host = urlparse(PAGEVIEWS_URL).netloc
+
+    def windows(self, start, end, granularity):
+        """Split a date range into windows to request separately.
+
+        Args:
+            start (datetime.datetime): The start date.
+            end (datetime.datetime): The end date.
+            granularity (str): hourly, daily or monthly counts.
+
+        Returns:
+            list: The (start, end) of each window.
+        """
+        # Monthly counts are requested in one go, as windows would have to align with months
+        if (granularity == 'monthly') or (not self.window):
+            return [(start, end)]
+        windows = []
+        step = datetime.timedelta(days=self.window)
+        while start <= end:
+            w_end = min(start + step - datetime.timedelta(hours=1 if granularity == 'hourly' else 24), end)
+            windows.append((start, w_end))
+            start = w_end + datetime.timedelta(hours=1 if granularity == 'hourly' else 24)
+        return windows
+
+    async def fetch(self, url, ttl=None):
+        """Get a pageviews API response, from the cache where possible.
+
+        Args:
+            url (str): The request URL.
+            ttl (float, optional): Time to live of the cached response in seconds. Defaults to None.
+
+        Returns:
+            list: The pageviews items returned.
+        """
+        if self.cache is not None:
+            ckey = self.cache.key('pageviews', url)
+            hit, items = self.cache.get(ckey)
+            if hit:
+                return items
+
+        request = lambda: rest_request(self.session, url)
+        if self.scheduler is None:
+            doc = await request()
+        else:
+            # Each attempt is throttled by the retry policy
+            await self.scheduler.acquire()
+            try:
+                doc = await self.scheduler.retry.run(request, key=url, scheduler=self.scheduler,
+                                                     host=self.host)
+            finally:
+                self.scheduler.release()
+        items = doc.get('items', [])
+
+        if self.cache is not None:
+            # Missing (404) or empty responses may be filled in later, so they always expire
+            if (not items) and (ttl is None):
+                ttl = self.cache.ttls['pageviews_recent'] or self.cache.ttls['default']
+            self.cache.set(ckey, items, ttl)
+        return items
+
+    async def article_views(self, project, articles, access='all-access', agent='all-agents',
+                            granularity='daily', start=None, end=None):
+        """Get pageview counts for one or more articles.
+
+        Args:
+            project (str): The wiki project, e.g. en.wikipedia.
+            articles (list): Article titles, or a single title.
+            access (str, optional): access method (desktop, mobile-web, mobile-app, all-access). Defaults to 'all-access'.
+            agent (str, optional): user agent type (spider, user, bot, all-agents). Defaults to 'all-agents'.
+            granularity (str, optional): hourly, daily or monthly counts. Defaults to 'daily'.
+            start (str|date, optional): The start date, as a date or YYYYMMDD string. Defaults to None (30 days before end).
+            end (str|date, optional): The end date, as a date or YYYYMMDD string. Defaults to None (today).
+
+        Returns:
+            dict: Pageviews of each article (with underscores) on each date. Views are None where no data is available.
+        """
+        end_date = pv_parse_date(end or datetime.date.today())
+        start_date = pv_parse_date(start) if start else end_date - datetime.timedelta(30)
+        if type(articles) is str:
+            articles = [articles]
+        articles = [a.replace(' ', '_') for a in articles]
+
+        # Fill in every date, so that missing data shows up as None
+        dates = pv_dates(start_date, end_date, granularity)
+        output = {date: {a: None for a in articles} for date in dates}
+
+        # Only request the dates missing from the store, grouping articles missing the same dates
+        if self.store is None:
+            ranges = {(start_date, end_date): articles}
+        else:
+            for date, pv in self.store.get(project, articles, dates, access, agent, granularity).items():
+                output[date].update(pv)
+            ranges = {}
+            positions = {d: i for i, d in enumerate(dates)}
+            for a, a_missing in self.store.missing(project, articles, dates, access, agent,
+                                                   granularity).items():
+                run = [a_missing[0]]
+                for d in a_missing[1:] + [None]:
+                    if (d is not None) and (positions[d] == positions[run[-1]] + 1):
+                        run.append(d)
+                        continue
+                    r_end = run[-1]
+                    if granularity == 'monthly':
+                        r_end = (r_end + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+                    ranges.setdefault((max(run[0], start_date), min(r_end, end_date)), []).append(a)
+                    run = [d]
+
+        # Request each window of each article concurrently
+        queries = []
+        for (r_start, r_end), r_articles in ranges.items():
+            for a in r_articles:
+                for w_start, w_end in self.windows(r_start, r_end, granularity):
+                    url = '/'.join([PAGEVIEWS_URL, 'per-article', project, access, agent,
+                                    quote(a, safe=''), granularity,
+                                    pv_format_date(w_start), pv_format_date(w_end)])
+                    ttl = pageviews_ttl(self.cache, w_end, self.lag) if self.cache is not None else None
+                    queries.append((url, ttl))
+        if self.scheduler is None:
+            results = await asyncio.gather(*[self.fetch(url, ttl) for url, ttl in queries])
+        else:
+            results = await self.scheduler.map(lambda r: self.fetch(*r), queries)
+
+        fetched = {}
+        for items in results:
+            for item in items:
+                fetched.setdefault(pv_parse_date(item['timestamp']), {})[item['article']] = item['views']
+        for date, pv in fetched.items():
+            output.setdefault(date, {}).update(pv)
+        if queries and not any(results):
+            print('Warning: The pageview API returned no data for any of the articles.')
+
+        # Save the requested dates to the store, including those without data
+        if self.store is not None:
+            requested = {}
+            for (r_start, r_end), r_articles in ranges.items():
+                for date in pv_dates(r_start, r_end, granularity):
+                    pv = output.get(date, {})
+                    requested.setdefault(date, {}).update({a: pv.get(a) for a in r_articles})
+            self.store.put(project, requested, access, agent, granularity)
+        return output
+
+    async def top_articles(self, project, access='all-access', granularity='daily', start=None, end=None):
+        """Get the most viewed articles of a project on each day or month, requesting all of them concurrently.
+
+        Args:
+            project (str): The wiki project, e.g. en.wikipedia.
+            access (str, optional): access method (desktop, mobile-web, mobile-app, all-access). Defaults to 'all-access'.
+            granularity (str, optional): daily or monthly lists. Defaults to 'daily'.
+            start (str|date, optional): The start date, as a date or YYYYMMDD string. Defaults to None (30 days before end).
+            end (str|date, optional): The end date, as a date or YYYYMMDD string. Defaults to None (today).
+
+        Returns:
+            dict: The top articles on each date, each with its article title (with underscores), views and rank.
+        """
+        end_date = pv_parse_date(end or datetime.date.today())
+        start_date = pv_parse_date(start) if start else end_date - datetime.timedelta(30)
+        dates = pv_dates(start_date, end_date, granularity)
+
+        # Each day (or month) is a separate request, cached separately
+        queries = []
+        for date in dates:
+            day = 'all-days' if granularity == 'monthly' else '%02d' % date.day
+            url = '/'.join([PAGEVIEWS_URL, 'top', project, access, str(date.year), '%02d' % date.month, day])
+            last = date
+            if granularity == 'monthly':
+                last = (date + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+            ttl = pageviews_ttl(self.cache, last, self.lag) if self.cache is not None else None
+            queries.append((url, ttl))
+        if self.scheduler is None:
+            results = await asyncio.gather(*[self.fetch(url, ttl) for url, ttl in queries])
+        else:
+            results = await self.scheduler.map(lambda r: self.fetch(*r), queries)
+
+        return {date: (items[0]['articles'] if items else []) for date, items in zip(dates, results)}
+
 class WTSession:
     """Session manager for querying the MediaWiki APIs.
 
@@ -293,23 +1076,52 @@ class WTSession:
         headers (dict, optional): HTTP headers. Defaults to {}.
         mw_session_args (dict, optional): mwapi session arguments. Defaults to {'formatversion':2}.
         lw_session_args (dict, optional): aiohttp session arguments. Defaults to {}.
-        pv_client_args (dict, optional): PageviewsClient arguments. Defaults to {}.
+        pv_client_args (dict, optional): AsyncPageviewsClient arguments, e.g. window. Defaults to {}.
+        scheduler_args (dict, optional): QueryScheduler arguments, e.g. max_concurrent and rate_limits. Defaults to {}.
+        retry_args (dict, optional): RetryPolicy arguments, e.g. max_retries and base_delay. Defaults to {}.
+        cache_args (dict, optional): ResponseCache arguments, e.g. path and max_size. Defaults to None (no caching).
     """
     def __init__(self, project, user_agent, headers={},
                  mw_session_args={'formatversion':2},
-                 lw_session_args={}, pv_client_args={}):
+                 lw_session_args={}, pv_client_args={}, scheduler_args={}, retry_args={},
+                 cache_args=None):
         mw_url = f'https://{project}.org'
         self.user_agent = user_agent
         self.mw_session = mwapi.AsyncSession(mw_url, user_agent=user_agent, **mw_session_args)
-        self.pv_client = PageviewsClient(user_agent=user_agent, **pv_client_args)
         self.lw_session = aiohttp.ClientSession('https://api.wikimedia.org',
                                                 headers=headers.update({'user-agent': user_agent}),
                                                 **lw_session_args)
+        self.cache = ResponseCache(**cache_args) if cache_args is not None else None
+        self.scheduler = QueryScheduler(retry=RetryPolicy(**retry_args), cache=self.cache,
+                                        **scheduler_args)
+        self.pv_client = AsyncPageviewsClient(self.mw_session, scheduler=self.scheduler,
+                                              cache=self.cache, **pv_client_args)
+        self.title_limit = None
+        self.title_limit_lock = asyncio.Lock()
+
+    async def get_title_limit(self):
+        """Get the maximum number of titles/IDs the account can send per query. The account's rights
+        are queried once per session: 500 if it has apihighlimits (e.g. bots), otherwise 50.
+
+        Returns:
+            int: The maximum number of titles/IDs per query.
+        """
+        # Concurrent first callers wait for the one query rather than each sending their own
+        async with self.title_limit_lock:
+            if self.title_limit is None:
+                data = await query_async(self.mw_session, {'meta': 'userinfo', 'uiprop': 'rights'},
+                                         continuation=False, debug=True, scheduler=self.scheduler,
+                                         host=session_host(self.mw_session))
+                rights = data.get('query', {}).get('userinfo', {}).get('rights', [])
+                self.title_limit = 500 if 'apihighlimits' in rights else 50
+        return self.title_limit
 
     async def close(self):
         """Close the session objects."""
         await self.mw_session.session.close()
         await self.lw_session.close()
+        if self.cache is not None:
+            self.cache.close()
 
     def __str__(self):
         return f"WTSession object with user agent {self.user_agent}"
\ No newline at end of file
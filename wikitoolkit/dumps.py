@@ -0,0 +1,1049 @@
+import bz2
+import datetime
+import functools
+import gzip
+import io
+import itertools
+import multiprocessing
+import os
+import re
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+from array import array
+from .tools import process_articles
+from .redirects import PageMaps
+from .storage import SQLiteMap, connect_sqlite
+from .pageviews import PageviewMatrix
+from .links import LinkGraph
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Tokens of the VALUES list of a MySQL INSERT statement
+SQL_TOKEN_RE = re.compile(r"\(|\)|'((?:[^'\\]|\\.)*)'|(NULL)|([^,()'\s;]+)")
+SQL_ESCAPE_RE = re.compile(r"\\(.)")
+SQL_ESCAPES = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+
+class ProcessReader(io.TextIOWrapper):
+    """Text stream of the output of a subprocess, which ends the process when closed.
+
+    Args:
+        proc (subprocess.Popen): The process, with its stdout piped.
+    """
+    def __init__(self, proc):
+        super().__init__(proc.stdout, encoding='utf-8', errors='replace')
+        self.proc = proc
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # Stop the process if it is still writing, e.g. when the file is not read to the end
+            if self.proc.poll() is None:
+                self.proc.kill()
+            self.proc.wait()
+
+def open_dump(path):
+    """Open a (possibly compressed) dump file for reading as text.
+
+    Args:
+        path (str): Path to the dump file. Files ending in .gz, .bz2 or .7z are decompressed on the fly
+          (.7z files with the 7z command line tool).
+
+    Raises:
+        ValueError: If a .7z file is given and the 7z tool is not installed.
+
+    Returns:
+        file: The opened text file.
+    """
+    if path.endswith('.7z'):
+        if shutil.which('7z') is None:
+            raise ValueError('The 7z command line tool is required to read .7z dumps')
+        proc = subprocess.Popen(['7z', 'e', '-so', path], stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+        return ProcessReader(proc)
+    elif path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    elif path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8', errors='replace')
+    else:
+        return open(path, 'r', encoding='utf-8', errors='replace')
+
+def parse_sql_value(string, null, other):
+    """Convert a token of a MySQL INSERT statement to a Python value.
+
+    Args:
+        string (str): The contents of a quoted string token, or None.
+        null (str): The NULL token, or None.
+        other (str): A numeric token, or None.
+
+    Returns:
+        str|int|float|None: The value.
+    """
+    if string is not None:
+        if '\\' in string:
+            return SQL_ESCAPE_RE.sub(lambda m: SQL_ESCAPES.get(m.group(1), m.group(1)), string)
+        return string
+    if null is not None:
+        return None
+    try:
+        return int(other)
+    except ValueError:
+        return float(other)
+
+def iter_sql_inserts(path):
+    """Stream the INSERT statements of a MediaWiki SQL table dump, with the table's column names.
+
+    Args:
+        path (str): Path to the SQL dump file.
+
+    Yields:
+        tuple: The column names, and the line of each INSERT statement.
+    """
+    table_columns = []
+    with open_dump(path) as f:
+        in_create = False
+        for line in f:
+            # Read the column names from the CREATE TABLE statement
+            if line.startswith('CREATE TABLE'):
+                in_create = True
+                table_columns = []
+                continue
+            if in_create:
+                if line.startswith(')'):
+                    in_create = False
+                elif line.lstrip().startswith('`'):
+                    table_columns.append(line.split('`')[1])
+                continue
+            if line.startswith('INSERT INTO'):
+                yield table_columns, line
+
+def parse_sql_insert(line, ix=None):
+    """Parse the rows of an INSERT statement of a SQL dump.
+
+    Args:
+        line (str): The INSERT statement.
+        ix (list, optional): Indices of the columns to return, in order. Defaults to None (all columns).
+
+    Returns:
+        list: The values of each row.
+    """
+    rows = []
+    row = None
+    for m in SQL_TOKEN_RE.finditer(line, line.index(' VALUES ') + 8):
+        token = m.group(0)
+        if token == '(':
+            row = []
+        elif token == ')':
+            if row is not None:
+                rows.append(tuple(row[i] for i in ix) if ix is not None else tuple(row))
+            row = None
+        elif row is not None:
+            row.append(parse_sql_value(*m.groups()))
+    return rows
+
+def column_indices(table_columns, columns):
+    """Get the indices of columns in a table.
+
+    Args:
+        table_columns (list): The column names of the table.
+        columns (list): Names of the columns to find, or None for all columns.
+
+    Raises:
+        ValueError: If a requested column is not in the table.
+
+    Returns:
+        list: The indices of the columns, or None for all columns.
+    """
+    if columns is None:
+        return None
+    missing = [c for c in columns if c not in table_columns]
+    if missing:
+        raise ValueError('Columns not in table: %s' % missing)
+    return [table_columns.index(c) for c in columns]
+
+def iter_sql_dump(path, columns=None):
+    """Stream the rows of a MediaWiki SQL table dump (e.g. page, redirect, page_props) without loading it into memory.
+
+    Args:
+        path (str): Path to the SQL dump file.
+        columns (list, optional): Names of the columns to return, in order. Defaults to None (all columns).
+
+    Raises:
+        ValueError: If a requested column is not in the table.
+
+    Yields:
+        tuple: The values of each row.
+    """
+    ix = None
+    for table_columns, line in iter_sql_inserts(path):
+        if (ix is None) and (columns is not None):
+            ix = column_indices(table_columns, columns)
+        yield from parse_sql_insert(line, ix)
+
+def dump_title(namespace, title, namespace_names={0: ''}):
+    """Convert a namespace number and database title from a dump to an API-style title.
+
+    Args:
+        namespace (int): The namespace number.
+        title (str): The title with underscores and no namespace prefix.
+        namespace_names (dict, optional): Names of the namespaces. Defaults to {0: ''}.
+
+    Returns:
+        str: The title with spaces and its namespace prefix, or None if the namespace name is unknown.
+    """
+    prefix = namespace_names.get(namespace)
+    if prefix is None:
+        return None
+    title = title.replace('_', ' ')
+    return f'{prefix}:{title}' if prefix else title
+
+def read_page_dump(path, namespaces=[0], namespace_names={0: ''}):
+    """Stream the pages from a page table SQL dump.
+
+    Args:
+        path (str): Path to the page table dump.
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        namespace_names (dict, optional): Names of the namespaces, used to prefix titles. Defaults to {0: ''}.
+
+    Yields:
+        tuple: Page ID, title, whether the page is a redirect.
+    """
+    namespaces = set(namespaces)
+    for pageid, ns, title, is_redirect in iter_sql_dump(path, ['page_id', 'page_namespace',
+                                                               'page_title', 'page_is_redirect']):
+        if ns in namespaces:
+            title = dump_title(ns, title, namespace_names)
+            if title is not None:
+                yield pageid, title, bool(is_redirect)
+
+def read_redirect_dump(path, namespaces=[0], namespace_names={0: ''}):
+    """Stream the redirect targets from a redirect table SQL dump.
+
+    Args:
+        path (str): Path to the redirect table dump.
+        namespaces (list, optional): Target namespaces to include. Defaults to [0].
+        namespace_names (dict, optional): Names of the namespaces, used to prefix titles. Defaults to {0: ''}.
+
+    Yields:
+        tuple: Redirect page ID, target title.
+    """
+    namespaces = set(namespaces)
+    for pageid, ns, title, interwiki in iter_sql_dump(path, ['rd_from', 'rd_namespace',
+                                                             'rd_title', 'rd_interwiki']):
+        # Skip redirects to other wikis
+        if (ns in namespaces) and not interwiki:
+            title = dump_title(ns, title, namespace_names)
+            if title is not None:
+                yield pageid, title
+
+def read_pages_articles(path, namespaces=[0]):
+    """Stream the pages from a pages-articles (or pages-meta) XML dump.
+
+    Args:
+        path (str): Path to the XML dump.
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+
+    Yields:
+        tuple: Page ID, title, redirect target title (None if the page is not a redirect).
+    """
+    namespaces = set(namespaces)
+    with open_dump(path) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if (event != 'end') or (elem.tag.rsplit('}', 1)[-1] != 'page'):
+                continue
+            # Only read the page's own fields, not those of its revisions
+            fields = {}
+            for child in elem:
+                ctag = child.tag.rsplit('}', 1)[-1]
+                if ctag == 'redirect':
+                    fields['redirect'] = child.get('title')
+                elif ctag in ('id', 'ns', 'title'):
+                    fields[ctag] = child.text
+            if int(fields['ns']) in namespaces:
+                yield int(fields['id']), fields['title'], fields.get('redirect')
+            # Free the memory used by the page
+            elem.clear()
+            root.clear()
+
+def iter_map_items(m, by_value=False):
+    """Iterate over the items of a map, streaming them from the database if it is a SQLiteMap.
+
+    Args:
+        m (dict|SQLiteMap): The map.
+        by_value (bool, optional): Whether to order the items by value. Defaults to False.
+
+    Returns:
+        iterator: The (key, value) items.
+    """
+    if isinstance(m, SQLiteMap):
+        return m.iter_items(by_value)
+    if by_value:
+        return iter(sorted(m.items(), key=lambda x: (x[1] is None, x[1] or '')))
+    return iter(list(m.items()))
+
+def batched_update(m, items, batchsize=100000):
+    """Update a map with a stream of items, a batch at a time.
+
+    Args:
+        m (dict|SQLiteMap): The map to update.
+        items (iterable): The (key, value) items.
+        batchsize (int, optional): Number of items written at a time. Defaults to 100000.
+    """
+    batch = {}
+    for k, v in items:
+        batch[k] = v
+        if len(batch) >= batchsize:
+            m.update(batch)
+            batch = {}
+    if batch:
+        m.update(batch)
+
+def fill_pagemaps(pagemaps, batchsize=100000):
+    """Fill the derived maps of a PageMaps object whose id_map and titles_redirect_map hold the pages and
+    redirects of a whole wiki. Redirect chains are resolved to their final target, and the other maps are
+    written by streaming over the maps, a batch at a time.
+
+    Args:
+        pagemaps (PageMaps): The PageMaps object to update.
+        batchsize (int, optional): Number of items written to each map at a time. Defaults to 100000.
+    """
+    ids = pagemaps.id_map
+    redirects = pagemaps.titles_redirect_map
+
+    # Resolve redirect chains (double redirects) to their final target. Only the redirects that change are
+    # held, and they are written after the map has been read.
+    chains = {}
+    for title, target in iter_map_items(redirects):
+        seen = {title}
+        final = target
+        while (final in redirects) and (final not in seen):
+            seen.add(final)
+            final = redirects[final]
+        # Redirect loops are left pointing at their first target
+        if (final != target) and (final not in seen):
+            chains[title] = final
+    batched_update(redirects, chains.items(), batchsize)
+
+    batched_update(pagemaps.pageids_redirect_map,
+                   ((ids[k], ids.get(v, -1)) for k, v in iter_map_items(redirects)), batchsize)
+
+    # Each canonical page is collected with itself, then with its redirects, grouped by target
+    canonical = ((t, i) for t, i in iter_map_items(ids) if t not in redirects)
+    batched_update(pagemaps.collected_title_redirects, ((t, [t]) for t, _ in canonical), batchsize)
+    canonical = ((t, i) for t, i in iter_map_items(ids) if t not in redirects)
+    batched_update(pagemaps.collected_pageid_redirects, ((i, [i]) for _, i in canonical), batchsize)
+
+    def grouped():
+        for target, group in itertools.groupby(iter_map_items(redirects, by_value=True), key=lambda x: x[1]):
+            if (target in ids) and (target not in redirects):
+                yield target, [target] + [k for k, _ in group]
+
+    batched_update(pagemaps.collected_title_redirects, grouped(), batchsize)
+    batched_update(pagemaps.collected_pageid_redirects,
+                   ((ids[t], [ids[x] for x in v]) for t, v in grouped()), batchsize)
+
+def build_pagemaps_from_dumps(page_path=None, redirect_path=None, xml_path=None, pagemaps=None,
+                              namespaces=[0], namespace_names={0: ''}, batchsize=100000):
+    """Build the redirect and ID maps of a whole wiki offline, from either the page and redirect table
+    SQL dumps or a pages-articles XML dump. Redirect resolution is then a local lookup with no API calls.
+    The dumps are streamed into the maps a batch at a time, so with a PageMaps backed by a SQLite store
+    the whole wiki is never held in memory.
+
+    Args:
+        page_path (str, optional): Path to the page table SQL dump. Defaults to None.
+        redirect_path (str, optional): Path to the redirect table SQL dump. Defaults to None.
+        xml_path (str, optional): Path to the pages-articles XML dump. Defaults to None.
+        pagemaps (PageMaps, optional): The PageMaps object to fill, e.g. one backed by a SQLite store. Defaults to None.
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        namespace_names (dict, optional): Names of the namespaces, used to prefix titles from the SQL dumps. Defaults to {0: ''}.
+        batchsize (int, optional): Number of items written to each map at a time. Defaults to 100000.
+
+    Raises:
+        ValueError: If neither both SQL dumps nor the XML dump are given.
+
+    Returns:
+        PageMaps: The filled PageMaps object.
+    """
+    if pagemaps is None:
+        pagemaps = PageMaps()
+
+    if page_path and redirect_path:
+        # The redirect dump refers to redirects by page ID, so their titles are kept in a temporary map,
+        # in the store if there is one
+        if pagemaps.conn is not None:
+            redirect_titles = SQLiteMap(pagemaps.conn, 'dump_redirect_titles')
+        else:
+            redirect_titles = {}
+        ids, titles = {}, {}
+        for pageid, title, is_redirect in read_page_dump(page_path, namespaces, namespace_names):
+            ids[title] = pageid
+            if is_redirect:
+                titles[pageid] = title
+            if len(ids) >= batchsize:
+                pagemaps.id_map.update(ids)
+                redirect_titles.update(titles)
+                ids, titles = {}, {}
+        pagemaps.id_map.update(ids)
+        redirect_titles.update(titles)
+
+        targets = ((redirect_titles.get(pageid), target)
+                   for pageid, target in read_redirect_dump(redirect_path, namespaces, namespace_names))
+        batched_update(pagemaps.titles_redirect_map, ((t, v) for t, v in targets if t is not None), batchsize)
+        if pagemaps.conn is not None:
+            with pagemaps.conn:
+                pagemaps.conn.execute('DROP TABLE dump_redirect_titles')
+    elif xml_path:
+        ids, redirects = {}, {}
+        for pageid, title, target in read_pages_articles(xml_path, namespaces):
+            ids[title] = pageid
+            if target is not None:
+                redirects[title] = target
+            if len(ids) >= batchsize:
+                pagemaps.id_map.update(ids)
+                pagemaps.titles_redirect_map.update(redirects)
+                ids, redirects = {}, {}
+        pagemaps.id_map.update(ids)
+        pagemaps.titles_redirect_map.update(redirects)
+    else:
+        raise ValueError('Must specify either page_path and redirect_path, or xml_path')
+
+    fill_pagemaps(pagemaps, batchsize)
+    return pagemaps
+
+def dump_timestamp(date):
+    """Convert a date to the timestamp format used in dumps and by the API, so dates can be compared as strings.
+
+    Args:
+        date (str|datetime.datetime): The date.
+
+    Returns:
+        str: The timestamp, e.g. '2020-01-01T00:00:00Z'.
+    """
+    if isinstance(date, datetime.datetime):
+        return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return date
+
+def parse_dump_revision(elem):
+    """Parse a revision element of an XML dump into the structure returned by the API.
+
+    Args:
+        elem (xml.etree.ElementTree.Element): The revision element.
+
+    Returns:
+        dict: The revision data.
+    """
+    rev = {'minor': False}
+    for child in elem:
+        tag = child.tag.rsplit('}', 1)[-1]
+        if tag == 'id':
+            rev['revid'] = int(child.text)
+        elif tag == 'parentid':
+            rev['parentid'] = int(child.text)
+        elif tag in ('timestamp', 'comment', 'sha1'):
+            rev[tag] = child.text or ''
+        elif tag == 'minor':
+            rev['minor'] = True
+        elif tag == 'contributor':
+            for c in child:
+                ctag = c.tag.rsplit('}', 1)[-1]
+                if ctag in ('username', 'ip'):
+                    rev['user'] = c.text
+                elif ctag == 'id':
+                    rev['userid'] = int(c.text)
+            if 'user' in rev:
+                rev.setdefault('userid', 0)
+        elif tag == 'text':
+            if child.get('bytes') is not None:
+                rev['size'] = int(child.get('bytes'))
+            rev['slots'] = {'main': {'content': child.text or ''}}
+    # Revisions have no parent ID in the dump when they are the first of their page
+    rev.setdefault('parentid', 0)
+    return rev
+
+def iter_history_dump(path, titles=None, pageids=None, start=None, stop=None, namespaces=[0], revids=None):
+    """Stream the revisions from a pages-meta-history XML dump in constant memory.
+
+    Args:
+        path (str): Path to the XML dump (.xml, .bz2, .gz or .7z).
+        titles (list, optional): Article titles to include. Defaults to None (all titles).
+        pageids (list, optional): Page IDs to include. Defaults to None (all pages).
+        start (str|datetime.datetime, optional): Earliest revision timestamp to include. Defaults to None.
+        stop (str|datetime.datetime, optional): Latest revision timestamp to include. Defaults to None.
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        revids (list, optional): Revision IDs to include. Defaults to None (all revisions).
+
+    Yields:
+        tuple: Page ID, title, revision data.
+    """
+    titles = set(titles) if titles is not None else None
+    pageids = set(int(x) for x in pageids) if pageids is not None else None
+    revids = set(int(x) for x in revids) if revids is not None else None
+    namespaces = set(namespaces)
+    start = dump_timestamp(start)
+    stop = dump_timestamp(stop)
+
+    with open_dump(path) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        page_elem = None
+        page = {}
+        keep = None
+        in_revision = False
+        for event, elem in context:
+            tag = elem.tag.rsplit('}', 1)[-1]
+            if event == 'start':
+                if tag == 'page':
+                    page_elem = elem
+                    page = {}
+                    keep = None
+                elif tag == 'revision':
+                    in_revision = True
+                    # The page's fields all come before its revisions
+                    if keep is None:
+                        keep = ((int(page['ns']) in namespaces)
+                                and ((titles is None) or (page['title'] in titles))
+                                and ((pageids is None) or (int(page['id']) in pageids)))
+                continue
+
+            if tag == 'revision':
+                in_revision = False
+                if keep:
+                    rev = parse_dump_revision(elem)
+                    if (((start is None) or (rev['timestamp'] >= start)) and ((stop is None) or (rev['timestamp'] <= stop))
+                            and ((revids is None) or (rev['revid'] in revids))):
+                        yield int(page['id']), page['title'], rev
+                # Free the memory used by the revision
+                elem.clear()
+                page_elem.remove(elem)
+            elif tag == 'page':
+                elem.clear()
+                root.clear()
+            elif (not in_revision) and (tag in ('id', 'ns', 'title')):
+                page[tag] = elem.text
+
+def iter_history_file(path, titles=None, pageids=None, start=None, stop=None, props=['timestamp', 'ids'],
+                      namespaces=[0], revids=None):
+    """Stream the revisions of one pages-meta-history XML dump file, with the fields of the API revision data.
+
+    Args:
+        path (str): Path to the XML dump.
+        titles (list, optional): Article titles to include. Defaults to None (all titles).
+        pageids (list, optional): Page IDs to include. Defaults to None (all pages).
+        start (str|datetime.datetime, optional): Earliest revision timestamp to include. Defaults to None.
+        stop (str|datetime.datetime, optional): Latest revision timestamp to include. Defaults to None.
+        props (list, optional): Revision properties to collect, as for the API rvprop. Defaults to ['timestamp', 'ids'].
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        revids (list, optional): Revision IDs to include. Defaults to None (all revisions).
+
+    Yields:
+        tuple: Page ID, title, revision data.
+    """
+    # Fields of the revision data returned for each rvprop
+    prop_fields = {'ids': ['revid', 'parentid'], 'timestamp': ['timestamp'], 'user': ['user'],
+                   'userid': ['userid'], 'comment': ['comment'], 'size': ['size'], 'sha1': ['sha1'],
+                   'flags': ['minor'], 'content': ['slots']}
+    fields = [x for p in props for x in prop_fields.get(p, [])]
+    for pageid, title, rev in iter_history_dump(path, titles=titles, pageids=pageids, start=start,
+                                                stop=stop, namespaces=namespaces, revids=revids):
+        yield pageid, title, {k: rev[k] for k in fields if k in rev}
+
+# Queue the history dump worker processes pass their revisions back on
+history_queue = None
+
+def init_history_worker(queue):
+    """Initialise a history dump worker process with the queue to pass revisions back on.
+
+    Args:
+        queue (multiprocessing.Queue): The queue.
+    """
+    global history_queue
+    history_queue = queue
+
+def queue_history_file(path, batchsize=1000, **kwargs):
+    """Pass the revisions of one pages-meta-history XML dump file back to the main process in batches,
+    followed by None when the file is done.
+
+    Args:
+        path (str): Path to the XML dump.
+        batchsize (int, optional): Number of revisions passed back at a time. Defaults to 1000.
+        **kwargs: Arguments for iter_history_file.
+    """
+    try:
+        batch = []
+        for item in iter_history_file(path, **kwargs):
+            batch.append(item)
+            if len(batch) >= batchsize:
+                history_queue.put(batch)
+                batch = []
+        if batch:
+            history_queue.put(batch)
+    finally:
+        history_queue.put(None)
+
+def iter_history_files(paths, processes=None, batchsize=1000, **kwargs):
+    """Stream the revisions of many pages-meta-history XML dump files, one process per file. Revisions are
+    passed back in batches through a bounded queue, so memory use does not grow with the size of the dumps.
+
+    Args:
+        paths (list): Paths to the XML dumps.
+        processes (int, optional): Number of processes to use. Defaults to None (one per CPU).
+        batchsize (int, optional): Number of revisions passed back from the processes at a time. Defaults to 1000.
+        **kwargs: Arguments for iter_history_file.
+
+    Yields:
+        tuple: Page ID, title, revision data.
+    """
+    if type(paths) == str:
+        paths = [paths]
+    if len(paths) == 1:
+        yield from iter_history_file(paths[0], **kwargs)
+        return
+
+    processes = processes or os.cpu_count()
+    queue = multiprocessing.Queue(maxsize=4*processes)
+    with multiprocessing.Pool(processes, initializer=init_history_worker, initargs=(queue,)) as pool:
+        result = pool.map_async(functools.partial(queue_history_file, batchsize=batchsize, **kwargs), paths)
+        done = 0
+        while done < len(paths):
+            batch = queue.get()
+            if batch is None:
+                done += 1
+                continue
+            yield from batch
+        # Raise any error from the processes
+        result.get()
+
+def get_revisions_from_dumps(paths, titles=None, pageids=None, start=None, stop=None,
+                             props=['timestamp', 'ids'], namespaces=[0], processes=None):
+    """Get revisions for pages between two dates from pages-meta-history XML dumps, as an offline
+    alternative to get_revisions.
+
+    Args:
+        paths (list): Paths to the XML dumps.
+        titles (list, optional): Article titles. Defaults to None.
+        pageids (list, optional): Page IDs. Defaults to None.
+        start (str|datetime.datetime, optional): Start date. Defaults to None.
+        stop (str|datetime.datetime, optional): Stop date. Defaults to None.
+        props (list, optional): Revision properties to collect. Defaults to ['timestamp', 'ids'].
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        processes (int, optional): Number of processes to use. Defaults to None (one per CPU).
+
+    Raises:
+        ValueError: If both titles and pageids are specified.
+
+    Returns:
+        dict: Revisions data, keyed by page ID if pageids are specified and by title otherwise.
+    """
+    if titles and pageids:
+        raise ValueError('Must specify at most one of titles or pageids')
+
+    # A page's history can be split across files
+    revisions = {}
+    for pageid, title, rev in iter_history_files(paths, processes=processes, titles=titles, pageids=pageids,
+                                                 start=start, stop=stop, props=props, namespaces=namespaces):
+        revisions.setdefault(pageid if pageids else title, []).append(rev)
+    return revisions
+
+def iter_revisions_content_from_dumps(paths, revids=None, titles=None, pageids=None, start=None, stop=None,
+                                      namespaces=[0], processes=None, batchsize=1000, store=None):
+    """Stream revision content from pages-meta-history XML dumps in batches, as an offline alternative to
+    aiter_revisions_content.
+
+    Args:
+        paths (list): Paths to the XML dumps.
+        revids (list, optional): Revision IDs. Defaults to None (all revisions).
+        titles (list, optional): Article titles. Defaults to None.
+        pageids (list, optional): Page IDs. Defaults to None.
+        start (str|datetime.datetime, optional): Start date. Defaults to None.
+        stop (str|datetime.datetime, optional): Stop date. Defaults to None.
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        processes (int, optional): Number of processes to use. Defaults to None (one per CPU).
+        batchsize (int, optional): Number of revisions in each batch. Defaults to 1000.
+        store (RevisionStore, optional): Store to save the content to. Defaults to None.
+
+    Yields:
+        dict: The content of a batch of revisions, keyed by revision ID.
+    """
+    batch = {}
+    for _, _, rev in iter_history_files(paths, processes=processes, batchsize=batchsize, titles=titles,
+                                        pageids=pageids, start=start, stop=stop, props=['ids', 'content'],
+                                        namespaces=namespaces, revids=revids):
+        batch[rev['revid']] = rev['slots']['main']['content']
+        if len(batch) >= batchsize:
+            if store is not None:
+                store.put_many(batch)
+            yield batch
+            batch = {}
+    if batch:
+        if store is not None:
+            store.put_many(batch)
+        yield batch
+
+def get_revisions_content_from_dumps(paths, revids=None, titles=None, pageids=None, start=None, stop=None,
+                                     namespaces=[0], processes=None, store=None):
+    """Get revision content from pages-meta-history XML dumps, as an offline alternative to get_revisions_content.
+
+    Args:
+        paths (list): Paths to the XML dumps.
+        revids (list, optional): Revision IDs. Defaults to None (all revisions).
+        titles (list, optional): Article titles. Defaults to None.
+        pageids (list, optional): Page IDs. Defaults to None.
+        start (str|datetime.datetime, optional): Start date. Defaults to None.
+        stop (str|datetime.datetime, optional): Stop date. Defaults to None.
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        processes (int, optional): Number of processes to use. Defaults to None (one per CPU).
+        store (RevisionStore, optional): Store to save the content to. Defaults to None.
+
+    Returns:
+        dict: The content of the revisions, keyed by revision ID.
+    """
+    revisions_content = {}
+    for batch in iter_revisions_content_from_dumps(paths, revids=revids, titles=titles, pageids=pageids,
+                                                   start=start, stop=stop, namespaces=namespaces,
+                                                   processes=processes, store=store):
+        revisions_content.update(batch)
+    return revisions_content
+
+# Project suffixes of the domain codes used in the hourly pageviews dumps
+PAGEVIEW_DOMAIN_SUFFIXES = {'wikipedia': '', 'wiktionary': '.d', 'wikibooks': '.b', 'wikinews': '.n',
+                            'wikiquote': '.q', 'wikisource': '.s', 'wikiversity': '.v',
+                            'wikivoyage': '.voy'}
+
+# Lookups shared by the pageview dump worker processes
+pageview_lookup = None
+pageview_redirects = None
+
+def pageview_domain_codes(project, access='all-access'):
+    """Get the domain codes of a project in the hourly pageviews dumps.
+
+    Args:
+        project (str): The wiki project, e.g. en.wikipedia.
+        access (str, optional): access method (desktop, mobile-web, all-access). Defaults to 'all-access'.
+
+    Raises:
+        ValueError: If the project is not supported.
+
+    Returns:
+        set: The domain codes.
+    """
+    lang, _, site = project.partition('.')
+    if site not in PAGEVIEW_DOMAIN_SUFFIXES:
+        raise ValueError('Unsupported project for hourly pageviews dumps: %s' % project)
+    suffix = PAGEVIEW_DOMAIN_SUFFIXES[site]
+    codes = set()
+    if access in ('all-access', 'desktop'):
+        codes.add(lang + suffix)
+    if access in ('all-access', 'mobile-web'):
+        codes.add(lang + '.m' + suffix)
+    return codes
+
+def pageview_dump_date(path):
+    """Get the date of a pageview_complete daily or hourly pageviews dump from its file name.
+
+    Args:
+        path (str): Path to the dump file.
+
+    Raises:
+        ValueError: If the file name does not contain a date.
+
+    Returns:
+        tuple: The date, and whether the dump is hourly.
+    """
+    m = re.search(r'pageviews-(\d{8})-(\d{2})0000', os.path.basename(path))
+    if m:
+        return datetime.datetime.strptime(m.group(1) + m.group(2), '%Y%m%d%H'), True
+    m = re.search(r'pageviews-(\d{8})-', os.path.basename(path))
+    if m:
+        return datetime.datetime.strptime(m.group(1), '%Y%m%d'), False
+    raise ValueError('Could not find a date in the file name: %s' % path)
+
+def init_pageview_worker(lookup, redirects, store=None):
+    """Share the title lookups with a pageview dump worker process.
+
+    Args:
+        lookup (dict): Canonical title of each dump title to include, or None to include all titles.
+        redirects (dict): Canonical title of each redirect title, used if lookup is None.
+        store (str, optional): Path to a PageMaps SQLite store to look up redirects in read-only, instead
+          of redirects. Defaults to None.
+    """
+    global pageview_lookup, pageview_redirects
+    pageview_lookup = lookup
+    if store is not None:
+        redirects = SQLiteMap(connect_sqlite(store, readonly=True), 'titles_redirect_map')
+    pageview_redirects = redirects
+
+def read_pageview_file(path, project, access='all-access'):
+    """Read the pageviews of a project from one pageview_complete daily or hourly pageviews dump,
+    grouping redirects with the lookups shared by init_pageview_worker.
+
+    Args:
+        path (str): Path to the dump file.
+        project (str): The wiki project, e.g. en.wikipedia.
+        access (str, optional): access method (desktop, mobile-web, mobile-app, all-access). Defaults to 'all-access'.
+
+    Returns:
+        tuple: The date, and the pageviews of each canonical title.
+    """
+    date, hourly = pageview_dump_date(path)
+    if hourly:
+        codes = pageview_domain_codes(project, access)
+        prefixes = tuple(c + ' ' for c in codes)
+    else:
+        prefixes = (project + ' ',)
+    lookup = pageview_lookup
+    redirects = pageview_redirects or {}
+
+    views = {}
+    with open_dump(path) as f:
+        for line in f:
+            if not line.startswith(prefixes):
+                continue
+            parts = line.split(' ')
+            # Hourly: domain title views bytes. Daily: project title page_id access views hourly_views
+            if hourly:
+                if parts[0] not in codes:
+                    continue
+                title, count = parts[1], parts[2]
+            else:
+                if (parts[0] != project) or ((access != 'all-access') and (parts[3] != access)):
+                    continue
+                title, count = parts[1], parts[4]
+            if lookup is not None:
+                canonical = lookup.get(title)
+                if canonical is None:
+                    continue
+            else:
+                title = title.replace('_', ' ')
+                canonical = redirects.get(title)
+                if canonical is None:
+                    canonical = title
+            views[canonical] = views.get(canonical, 0) + int(count)
+    return date, views
+
+def dump_article_views(paths, project, titles=None, pagemaps=None, access='all-access',
+                       processes=None, as_matrix=False, dtype='int64'):
+    """Get pageviews for articles from pageview_complete daily dumps or hourly pageviews dumps, as an offline
+    alternative to api_article_views. Redirects are grouped on the fly, and each file is read in its own process.
+
+    Args:
+        paths (list): Paths to the dump files, e.g. pageviews-20240101-user.bz2 or pageviews-20240101-000000.gz.
+        project (str): The wiki project, e.g. en.wikipedia.
+        titles (list, optional): Article titles to get pageviews for. Defaults to None (all articles).
+        pagemaps (PageMaps, optional): The PageMaps object to group redirects with. The redirects of the titles
+          should already be collected with get_redirects. If no titles are given and the PageMaps is backed by
+          a SQLite store, each process looks up redirects in the store read-only. Defaults to None.
+        access (str, optional): access method (desktop, mobile-web, mobile-app, all-access). Hourly dumps have no
+          mobile-app data. Defaults to 'all-access'.
+        processes (int, optional): Number of processes to use. Defaults to None (one per CPU).
+        as_matrix (bool, optional): Whether to return a PageviewMatrix instead of a dictionary. Defaults to False.
+        dtype (str, optional): Integer type of the PageviewMatrix. Defaults to 'int64'.
+
+    Returns:
+        dict|PageviewMatrix: Pageviews for articles, in the same format as api_article_views.
+    """
+    if type(paths) == str:
+        paths = [paths]
+
+    # Map each dump title (with underscores) to its canonical title
+    lookup = None
+    redirects = None
+    store = None
+    if titles is not None:
+        if type(titles) == str:
+            titles = [titles]
+        if pagemaps is not None:
+            titles = process_articles(titles, pagemaps=pagemaps)
+            lookup = {r.replace(' ', '_'): t for t in titles
+                      for r in pagemaps.collected_title_redirects.get(t, [t])}
+        else:
+            lookup = {t.replace(' ', '_'): t for t in titles}
+    elif pagemaps is not None:
+        redirects = pagemaps.titles_redirect_map
+        # Workers look up redirects in the store themselves, rather than each being sent the whole map
+        if pagemaps.conn is not None:
+            store = pagemaps.store
+
+    if len(paths) == 1:
+        init_pageview_worker(lookup, redirects)
+        results = [read_pageview_file(paths[0], project, access)]
+    else:
+        with multiprocessing.Pool(processes, initializer=init_pageview_worker,
+                                  initargs=(lookup, None if store else redirects, store)) as pool:
+            results = pool.map(functools.partial(read_pageview_file, project=project, access=access),
+                               paths, chunksize=1)
+
+    # Combine the files, e.g. the user and automated agent files of the same day
+    pageviews = {}
+    for date, views in results:
+        pv = pageviews.setdefault(date, {t: 0 for t in (titles or [])})
+        for k, v in views.items():
+            pv[k] = pv.get(k, 0) + v
+    pageviews = dict(sorted(pageviews.items()))
+
+    if as_matrix:
+        return PageviewMatrix.from_dict(pageviews, dtype=dtype)
+    return pageviews
+
+def id_lookup(ids, values):
+    """Create an array mapping integer IDs to values, for vectorized lookups.
+
+    Args:
+        ids (array): The IDs.
+        values (array): The value of each ID.
+
+    Returns:
+        numpy.ndarray: The value at each ID, -1 where there is none.
+    """
+    ids = np.frombuffer(ids, dtype=np.int64)
+    lookup = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int32)
+    lookup[ids] = np.frombuffer(values, dtype=np.int32)
+    return lookup
+
+def look_up(lookup, ids):
+    """Look up many IDs in an array created by id_lookup.
+
+    Args:
+        lookup (numpy.ndarray): The lookup array.
+        ids (numpy.ndarray): The IDs.
+
+    Returns:
+        numpy.ndarray: The value of each ID, -1 where there is none.
+    """
+    values = np.full(len(ids), -1, dtype=np.int32)
+    found = (ids >= 0) & (ids < len(lookup))
+    values[found] = lookup[ids[found]]
+    return values
+
+def parse_pagelinks_insert(line, ix, by_title=False):
+    """Parse the rows of an INSERT statement of a pagelinks SQL dump.
+
+    Args:
+        line (str): The INSERT statement.
+        ix (list): Indices of the source page ID, source namespace and target columns.
+        by_title (bool, optional): Whether targets are given by namespace and title (older dumps) rather
+          than linktarget ID. Defaults to False.
+
+    Returns:
+        numpy.ndarray|list: Source page ID, source namespace and target ID of each link as an array, or the rows
+          if targets are given by title.
+    """
+    rows = parse_sql_insert(line, ix)
+    if by_title:
+        return rows
+    return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+def build_link_graph_from_dumps(pagelinks_path, linktarget_path=None, page_path=None, redirect_path=None,
+                                pagemaps=None, namespaces=[0], namespace_names={0: ''}, missing=True,
+                                processes=None, store=None):
+    """Build the link graph of a whole wiki offline from the pagelinks SQL dump. Link targets are resolved to
+    canonical pages with a PageMaps built from the page and redirect dumps, and the INSERT statements of the
+    pagelinks dump are parsed in parallel, a bounded number at a time. Given a store, the PageMaps is kept in
+    SQLite rather than memory, but the graph's own title to node table necessarily holds every page, so memory
+    use is still O(pages) as well as O(links) for the graph itself.
+
+    Args:
+        pagelinks_path (str): Path to the pagelinks table SQL dump.
+        linktarget_path (str, optional): Path to the linktarget table SQL dump, needed for dumps where pagelinks
+          refer to link targets by ID. Defaults to None.
+        page_path (str, optional): Path to the page table SQL dump. Defaults to None.
+        redirect_path (str, optional): Path to the redirect table SQL dump. Defaults to None.
+        pagemaps (PageMaps, optional): PageMaps of the whole wiki, instead of building one from the page and redirect
+          dumps. Defaults to None.
+        namespaces (list, optional): Namespaces to include. Defaults to [0].
+        namespace_names (dict, optional): Names of the namespaces, used to prefix titles. Defaults to {0: ''}.
+        missing (bool, optional): Whether to include links to missing pages. Defaults to True.
+        processes (int, optional): Number of processes to use. Defaults to None (one per CPU).
+        store (str, optional): Path to a SQLite database to build the PageMaps in, if no pagemaps are given.
+          Defaults to None.
+
+    Raises:
+        ValueError: If the pagelinks dump refers to link targets by ID and no linktarget dump is given.
+
+    Returns:
+        LinkGraph: The link graph, in the same form as build_link_graph.
+    """
+    if pagemaps is None:
+        pagemaps = build_pagemaps_from_dumps(page_path, redirect_path, pagemaps=PageMaps(store=store),
+                                             namespaces=namespaces, namespace_names=namespace_names)
+    redirects = pagemaps.titles_redirect_map
+    namespaces = list(namespaces)
+    graph = LinkGraph()
+
+    # Map the page IDs of canonical pages to nodes
+    ids, nodes = array('q'), array('i')
+    for title, pageid in iter_map_items(pagemaps.id_map):
+        if (title is None) or (pageid is None) or (pageid < 0) or (title in redirects):
+            continue
+        ids.append(pageid)
+        nodes.append(graph.node(title))
+    page_nodes = id_lookup(ids, nodes)
+
+    def target_node(ns, title):
+        title = dump_title(ns, title, namespace_names) if ns in namespaces else None
+        if title is None:
+            return -1
+        title = redirects.get(title, title)
+        if (title is None) or ((not missing) and (title not in graph.ids)):
+            return -1
+        return graph.node(title)
+
+    # Map the link targets to nodes, resolving redirects
+    if linktarget_path is not None:
+        ids, nodes = array('q'), array('i')
+        for lt_id, ns, title in iter_sql_dump(linktarget_path, ['lt_id', 'lt_namespace', 'lt_title']):
+            node = target_node(ns, title)
+            if node >= 0:
+                ids.append(lt_id)
+                nodes.append(node)
+        target_nodes = id_lookup(ids, nodes)
+
+    inserts = iter_sql_inserts(pagelinks_path)
+    first = next(inserts, None)
+    if first is None:
+        graph.build()
+        return graph
+    table_columns = first[0]
+    by_title = 'pl_target_id' not in table_columns
+    if (not by_title) and (linktarget_path is None):
+        raise ValueError('The pagelinks dump refers to link targets by ID, so a linktarget dump is needed')
+    columns = ['pl_from', 'pl_from_namespace'] + (['pl_namespace', 'pl_title'] if by_title else ['pl_target_id'])
+    worker = functools.partial(parse_pagelinks_insert, ix=column_indices(table_columns, columns),
+                               by_title=by_title)
+    lines = itertools.chain([first[1]], (line for _, line in inserts))
+
+    processes = processes or os.cpu_count()
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        while True:
+            # Only a few INSERT statements per process are held at once
+            window = list(itertools.islice(lines, 4*processes))
+            if not window:
+                break
+            for rows in (pool.map(worker, window) if pool is not None else map(worker, window)):
+                if by_title:
+                    for pl_from, from_ns, ns, title in rows:
+                        if (from_ns in namespaces) and (pl_from < len(page_nodes)) and (page_nodes[pl_from] >= 0):
+                            node = target_node(ns, title)
+                            if node >= 0:
+                                graph.sources.append(int(page_nodes[pl_from]))
+                                graph.targets.append(node)
+                    continue
+                # Map a whole batch of links to nodes at once
+                rows = rows[np.isin(rows[:, 1], namespaces)]
+                sources = look_up(page_nodes, rows[:, 0])
+                targets = look_up(target_nodes, rows[:, 2])
+                valid = (sources >= 0) & (targets >= 0)
+                graph.sources.frombytes(sources[valid].tobytes())
+                graph.targets.frombytes(targets[valid].tobytes())
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    graph.build()
+    return graph
@@ -1,7 +1,15 @@
+import itertools
+import os
+import pickle
+from array import array
+from collections import deque
 from .api import *
 from .redirects import *
 import mwapi
-import time
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 async def parse_links(data, prop):
@@ -9,51 +17,46 @@ async def parse_links(data, prop):
 
     Args:
         data (list): Data from the API.
+        prop (str / list): The kind of link data to parse, or a list of kinds fetched in a single query.
+
+    Returns:
+        dict: The parsed link data for each (pageid, title) in the batch, or a dictionary of these for each kind.
+    """
+    pages = await data
+    if type(prop) == str:
+        return parse_link_pages(pages, prop)
+    return {p: parse_link_pages(pages, p) for p in prop}
+
+def parse_link_pages(pages, prop):
+    """Parse one kind of link data from the pages returned by the API.
+
+    Args:
+        pages (list): Pages returned by the API.
         prop (str): The kind of link data to parse.
 
     Returns:
-        tuple|dict: The parsed link data, including redirects, normalisations and pageids where appropriate.
+        dict: The parsed link data for each (pageid, title) in the batch.
     """
 
-    # For regular in/out-links
+    # For regular in/out-links, demultiplex the links of each page in the batch
     if prop in ['links', 'linkshere']:
-        # Initialize variables
-        links = []
-        redirects = {}
-        norms = {}
-        ids = {}
-
-        for page in await data:
-            if 'query' not in page:
-                if 'title' in page:
-                    links.append(page)
-                else:
-                    links = None
-            
+        links = {}
+        for page in pages:
+            k = (page.get('pageid'), page.get('title'))
+            # Missing pages have no links
+            if ('missing' in page) or ('invalid' in page):
+                links[k] = None
+            # Pages are returned again in each continued portion, so extend their links
+            elif k in links:
+                links[k].extend(page.get(prop, []))
             else:
-                # Collect links
-                links.extend(page['query'].get('pages', []))
-                
-                # Collect redirects
-                redirects.update({x['from']: x['to']
-                                for x in page['query'].get('redirects', {})})
-                redirects.update({l['title']: None
-                                for l in page['query'].get('pages', [])
-                                if 'missing' in l})
-                
-                # Collect normalizations
-                norms.update({x['from']: x['to']
-                                for x in page['query'].get('normalized', {})})
-                
-                # Collect page ids
-                ids.update({x['title']: x.get('pageid', -1)
-                                for x in page['query'].get('pages', [])})
-
-        return links, redirects, norms, ids
+                links[k] = list(page.get(prop, []))
+
+        return links
 
     # Handle other types of link data (langlinks, iwlinks, extlinks)
     links = {}
-    for page in await data:
+    for page in pages:
         new_links = {(page['pageid'], page['title']): page.get(prop, [])}
         for k, v in new_links.items():
             if k in links:
@@ -74,8 +77,184 @@ async def parse_links(data, prop):
     else:
         return links
 
-async def get_links(wtsession, mode='out', titles=None, pageids=None, pagemaps=None, namespaces=[0], update_maps=False, batchsize=200):
-    """Get links to/from a list of articles from the API. Runs asynchronously.
+def resolve_links(links, pagemaps):
+    """Map out/in-links to their canonical pages, using the redirects, normalisations and page IDs in the page maps.
+
+    Args:
+        links (dict): Links for each article, as returned by parse_links.
+        pagemaps (PageMaps): The PageMaps object to map redirects with.
+
+    Returns:
+        dict: Links for each article, with each link given as a page dictionary (pageid, ns, title), or marked as missing.
+    """
+    resolved = {}
+    for k, v in links.items():
+        if v is None:
+            resolved[k] = None
+            continue
+        # Collapse links to the same page via different redirects
+        pages = {}
+        for l in v:
+            title = pagemaps.norm_map.get(l['title'], l['title'])
+            target = pagemaps.titles_redirect_map.get(title, title)
+            if target is None:
+                pages[title] = {'ns': l['ns'], 'title': title, 'missing': True}
+            else:
+                pages[target] = {'pageid': pagemaps.id_map.get(target, -1), 'ns': l['ns'],
+                                 'title': target}
+        resolved[k] = list(pages.values())
+    return resolved
+
+def link_modes(mode):
+    """Convert a get_links mode argument to a list of modes.
+
+    Args:
+        mode (str / list): The kind of links to get.
+
+    Returns:
+        list: The link modes.
+    """
+    if type(mode) == str:
+        if mode == 'all':
+            return ['out', 'in', 'lang', 'interwiki', 'ext']
+        else:
+            return [mode]
+    return list(mode)
+
+class LinkGraph:
+    """Compact directed link graph. Titles are interned to int32 node IDs as links are added, and the
+    edges are stored as a compressed sparse row (CSR) adjacency of indptr/indices arrays. Requires NumPy.
+
+    Args:
+        titles (list, optional): The title of each node. Defaults to None.
+        indptr (numpy.ndarray, optional): CSR row pointers, of length len(titles)+1. Defaults to None.
+        indices (numpy.ndarray, optional): CSR column indices (target node IDs). Defaults to None.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+    """
+    def __init__(self, titles=None, indptr=None, indices=None):
+        if np is None:
+            raise ImportError('NumPy is required for LinkGraph')
+        self.titles = list(titles) if titles is not None else []
+        self.ids = {t: i for i, t in enumerate(self.titles)}
+        self.indptr = np.asarray(indptr) if indptr is not None else np.zeros(len(self.titles)+1, dtype=np.int64)
+        self.indices = np.asarray(indices) if indices is not None else np.zeros(0, dtype=np.int32)
+        # Edges added since the CSR arrays were last built
+        self.sources = array('i')
+        self.targets = array('i')
+
+    def node(self, title):
+        """Get the node ID of a title, adding it to the graph if necessary.
+
+        Args:
+            title (str): The title.
+
+        Returns:
+            int: The node ID.
+        """
+        i = self.ids.get(title)
+        if i is None:
+            i = self.ids[title] = len(self.titles)
+            self.titles.append(title)
+        return i
+
+    def add_links(self, source, targets):
+        """Add links from a page.
+
+        Args:
+            source (str): The title of the linking page.
+            targets (list): The titles of the linked pages.
+        """
+        s = self.node(source)
+        for t in targets:
+            self.sources.append(s)
+            self.targets.append(self.node(t))
+
+    def build(self):
+        """Merge the added links into the CSR arrays, removing duplicate links."""
+        n = len(self.titles)
+        old_sources = np.repeat(np.arange(len(self.indptr)-1, dtype=np.int64), np.diff(self.indptr))
+        sources = np.concatenate([old_sources, np.frombuffer(self.sources, dtype=np.int32)])
+        targets = np.concatenate([self.indices, np.frombuffer(self.targets, dtype=np.int32)])
+        # Sorting the edges by a combined key groups them into rows
+        keys = np.unique(sources.astype(np.int64) * max(n, 1) + targets)
+        self.indices = (keys % max(n, 1)).astype(np.int32)
+        self.indptr = np.zeros(n+1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // max(n, 1), minlength=n), out=self.indptr[1:])
+        self.sources = array('i')
+        self.targets = array('i')
+
+    def neighbours(self, title):
+        """Get the titles a page links to.
+
+        Args:
+            title (str): The title.
+
+        Returns:
+            list: The linked titles.
+        """
+        if self.sources:
+            self.build()
+        i = self.ids.get(title)
+        if (i is None) or (i >= len(self.indptr)-1):
+            return []
+        return [self.titles[j] for j in self.indices[self.indptr[i]:self.indptr[i+1]]]
+
+    def to_scipy(self):
+        """Convert the graph to a SciPy CSR adjacency matrix. Requires SciPy.
+
+        Returns:
+            scipy.sparse.csr_matrix: The adjacency matrix.
+        """
+        from scipy.sparse import csr_matrix
+        if self.sources:
+            self.build()
+        n = len(self.titles)
+        return csr_matrix((np.ones(len(self.indices), dtype=np.int8), self.indices, self.indptr),
+                          shape=(n, n))
+
+    def save(self, path):
+        """Save the graph to a directory, with the CSR arrays as .npy files.
+
+        Args:
+            path (str): The directory to save to.
+        """
+        if self.sources:
+            self.build()
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'indptr.npy'), self.indptr)
+        np.save(os.path.join(path, 'indices.npy'), self.indices)
+        # Titles are stored as text, as fixed-width string arrays would be padded to the longest title
+        with open(os.path.join(path, 'titles.txt'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.titles))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a graph saved with save, memory-mapping the CSR arrays.
+
+        Args:
+            path (str): The directory to load from.
+            mmap_mode (str, optional): numpy.load memory-map mode, or None to read the arrays into memory. Defaults to 'r'.
+
+        Returns:
+            LinkGraph: The graph.
+        """
+        with open(os.path.join(path, 'titles.txt'), encoding='utf-8') as f:
+            titles = f.read().split('\n')
+        if titles == ['']:
+            titles = []
+        return cls(titles, np.load(os.path.join(path, 'indptr.npy'), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, 'indices.npy'), mmap_mode=mmap_mode))
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __str__(self):
+        return f"LinkGraph with {len(self.titles)} nodes and {len(self.indices) + len(self.targets)} links"
+
+async def aiter_links(wtsession, mode='out', titles=None, pageids=None, pagemaps=None, namespaces=[0], update_maps=False, batchsize=200):
+    """Stream links to/from a list of articles from the API, yielding each batch of articles as soon as it is collected. Runs asynchronously.
 
     Args:
         wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
@@ -85,15 +264,16 @@ async def get_links(wtsession, mode='out', titles=None, pageids=None, pagemaps=N
         pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
         namespaces (list, optional): The wiki namespaces to collect links from. Defaults to [0].
         update_maps (bool, optional): Whether to update maps on link collection. Defaults to False.
-        batchsize (int, optional): How many pages to collect links for at a time - for rate limiting purposes. Defaults to 200.
+        batchsize (int, optional): How many articles to collect links for before updating the maps and passing the links on. Defaults to 200.
 
     Raises:
         ValueError: If titles and pageids are not specified or if both are specified.
 
-    Returns:
-        dict: A dictionary of links (format depends on mode(s)).
+    Yields:
+        tuple: The link mode and a dictionary of links for a batch of articles. Out/in-links are given as the
+          API's {'ns', 'title'} link entries, or with update_maps as resolved page dictionaries ({'pageid', 'ns',
+          'title'}, or marked 'missing'). Articles that are missing themselves have None.
     """
-
     # Check if titles or pageids are specified
     if not (bool(titles) ^ bool(pageids)):
         raise ValueError('Must specify exactly one of titles or pageids')
@@ -109,89 +289,124 @@ async def get_links(wtsession, mode='out', titles=None, pageids=None, pagemaps=N
     else:
         ns = '|'.join([str(x) for x in namespaces])
 
-    # Define dictionary for different modes of link data
-    modedict = {'out': {'pg':'generator', 'pval': 'links', 'ns': 'gplnamespace', 'limit': 'gpllimit'},
-                'in': {'pg':'generator', 'pval': 'linkshere', 'ns': 'glhnamespace', 'limit': 'glhlimit'},
+    # Define dictionary for different modes of link data. Out/in-links also have a generator form,
+    # used to resolve the redirects, normalisations and page IDs of the linked pages in bulk.
+    modedict = {'out': {'pg':'prop', 'pval': 'links', 'ns': 'plnamespace', 'limit': 'pllimit',
+                        'gns': 'gplnamespace', 'glimit': 'gpllimit'},
+                'in': {'pg':'prop', 'pval': 'linkshere', 'ns': 'lhnamespace', 'limit': 'lhlimit',
+                       'gns': 'glhnamespace', 'glimit': 'glhlimit'},
                 'lang': {'pg':'prop', 'pval': 'langlinks', 'limit': 'lllimit'},
                 'interwiki': {'pg':'prop', 'pval': 'iwlinks', 'limit': 'iwlimit'},
                 'ext': {'pg':'prop', 'pval': 'extlinks', 'limit': 'ellimit'}}
     
-    # Convert mode to list if it is a string
-    if type(mode) == str:
-        if mode == 'all':
-            mode = ['out', 'in', 'lang', 'interwiki', 'ext']
-        else:
-            mode = [mode]
-    
-    # Collect links for each mode
-    return_dict = {}
-    for m in mode:
-        print('Getting %s-links' % m)
+    # Out/in-links are queried separately, while the other kinds of link are page props that can be
+    # fused into a single query, so each page is only fetched once for all of them
+    modes = link_modes(mode)
+    mode_groups = [[m] for m in modes if m in ['out', 'in']]
+    if any(m not in ['out', 'in'] for m in modes):
+        mode_groups.append([m for m in modes if m not in ['out', 'in']])
+
+    title_limit = await wtsession.get_title_limit()
+    maps_task = query_task_factory(wtsession.mw_session, parse_redirects, debug=True,
+                                   scheduler=wtsession.scheduler)
+    # Set up the queries and link buffers of each group of modes
+    groups = []
+    for group in mode_groups:
+        for m in group:
+            print('Getting %s-links' % m)
+        props = [modedict[m]['pval'] for m in group]
         # Define parameters for the API query
-        params = {modedict[m]['pg']: modedict[m]['pval'],
-                  modedict[m]['limit']: 'max',
-                  'redirects':update_maps}
-        if m in ['out', 'in']:
-            params[modedict[m]['ns']] = ns
-
-        # Iterate through the articles in batches, try/except block to handle rate errors
-        n = 0
-        links = {}
-        size = len(titles) if titles else len(pageids)
-        while n < size:
-            # Get the batch of articles (titles or pageids)
-            if titles:
-                b_titles = titles[n:n+batchsize]
-                b_pageids = None
-            else:
-                b_titles = None
-                b_pageids = pageids[n:n+batchsize]
-            try:
-                # Create a list of query arguments
-                query_args_list, key, ix = querylister(b_titles, b_pageids,
-                                                    generator=(m in ['out', 'in']),
-                                                    pagemaps=pagemaps,
-                                                    params=params)
-                # Query the API for the links
-                data = await iterate_async_query(wtsession.mw_session, query_args_list,
-                                                function=parse_links, f_args=[modedict[m]['pval']],
-                                                debug=update_maps&(m in ['out', 'in']))
-
-                # Parse the data for regular out/in-links and update the maps if necessary
-                if m in ['out', 'in']:
-                    data_keys = [x[key] for x in query_args_list]
-                    missing = [data_keys[n] for n in range(len(data)) if data[n][0] is None]
-                    b_links = dict(zip(data_keys, [x[0] for x in data]))
-                    if update_maps:
-                        update_data = [x[1:] for x in data]
-                        missing_data = [({x: None for x in missing}, {}, {x: -1 for x in missing})]
-                        await pagemaps.update_maps(wtsession, update_data + missing_data)
-                else:
-                    b_links = {k[ix]: val for d in data for k, val in d.items()}
-
-            # handle rate error, this doesn't all run automatically, so need to address further issues
-            # except (ValueError, ConnectionError, ClientConnectorError, ConnectionResetError) as v: ????
-            except Exception as v: # TODO: Be more specific here
-                print(v)
-                #split arts in half and try again
-                batchsize = batchsize // 2
-                time.sleep(10)
-                print('%.2f%% complete' % (100*n/size))
-                print('Trying again at n=%d with batchsize=%d' % (n, batchsize))
-                continue
+        params = {'prop': '|'.join(props), 'redirects': update_maps}
+        for m in group:
+            params[modedict[m]['limit']] = 'max'
+            if m in ['out', 'in']:
+                params[modedict[m]['ns']] = ns
+
+        # Create a list of query arguments, batching many articles into each query
+        query_args_list, key, ix = querylister(titles, pageids,
+                                            generator=False,
+                                            pagemaps=pagemaps,
+                                            params=params,
+                                            chunksize=title_limit)
+        groups.append({'modes': group, 'props': props, 'query_args_list': query_args_list, 'key': key, 'ix': ix,
+                      'links_task': query_task_factory(wtsession.mw_session, parse_links, [props],
+                                                       scheduler=wtsession.scheduler),
+                      'resolve': update_maps and (group[0] in ['out', 'in']),
+                      'n': 0, 'links': {m: {} for m in group}, 'update_data': [], 'missing': []})
+
+    async def make_task(item):
+        # The group is passed with each query, so the task does not depend on loop variables
+        gi, query_args = item
+        group = groups[gi]
+        # Collect the links of each article in the batch
+        data = await group['links_task'](query_args)
+        if not group['resolve']:
+            return gi, data, None
+        # Resolve all the pages linked to/from the batch at once with the generator form
+        m = group['modes'][0]
+        gen_args = {group['key']: query_args[group['key']], 'generator': modedict[m]['pval'],
+                    modedict[m]['glimit']: 'max', modedict[m]['gns']: ns, 'redirects': True}
+        return gi, data, await maps_task(gen_args)
+
+    # Interleave the queries of the groups, so that all modes are collected concurrently
+    items = []
+    for batch in itertools.zip_longest(*[g['query_args_list'] for g in groups]):
+        items.extend((gi, query_args) for gi, query_args in enumerate(batch) if query_args is not None)
 
-            # Update the links dictionary with the links from the batch
-            links.update(b_links)
+    # Pass on the links in batches, updating the maps for each batch if necessary
+    async for _, (gi, data, maps_data) in wtsession.scheduler.imap(make_task, items):
+        group = groups[gi]
+        ix = group['ix']
+        for m, prop in zip(group['modes'], group['props']):
+            group['links'][m].update({k[ix]: val for k, val in data[prop].items()})
+        if group['resolve']:
+            group['missing'].extend([k[ix] for k, val in data[group['props'][0]].items() if val is None])
+            group['update_data'].append(maps_data)
+        group['n'] += 1
 
-            # Update the index to start collecting the next batch
-            n += batchsize
-            # Update the batchsize if necessary
-            if batchsize < 200:
-                batchsize = min(batchsize * 2, 200)
-                print('Increasing batchsize to %d' % batchsize)
+        if ((len(group['links'][group['modes'][0]]) >= batchsize)
+                or (group['n'] == len(group['query_args_list']))):
+            if group['resolve']:
+                if titles:
+                    group['update_data'].append(({x: None for x in group['missing']}, {},
+                                                 {x: -1 for x in group['missing']}))
+                await pagemaps.update_maps(wtsession, group['update_data'])
+                group['links'] = {m: resolve_links(b_links, pagemaps) for m, b_links in group['links'].items()}
+            for m, b_links in group['links'].items():
+                yield m, b_links
+            group['links'] = {m: {} for m in group['modes']}
+            group['update_data'] = []
+            group['missing'] = []
+
+
+async def get_links(wtsession, mode='out', titles=None, pageids=None, pagemaps=None, namespaces=[0], update_maps=False, batchsize=200):
+    """Get links to/from a list of articles from the API. Runs asynchronously.
 
-        # Add the full links of each type to the return dictionary
-        return_dict[m] = links
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        mode (str / list, optional): The kind of links to get. Defaults to 'out'.
+        titles (list, optional): The article titles to collect links for. Must specify exactly one of titles or pageids. Defaults to None.
+        pageids (list, optional): The article IDs to collect links for. Must specify exactly one of titles or pageids. Defaults to None.
+        pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
+        namespaces (list, optional): The wiki namespaces to collect links from. Defaults to [0].
+        update_maps (bool, optional): Whether to update maps on link collection. Defaults to False.
+        batchsize (int, optional): How many articles to collect links for before updating the maps and passing the links on. Defaults to 200.
+
+    Raises:
+        ValueError: If titles and pageids are not specified or if both are specified.
+
+    Returns:
+        dict: A dictionary of links (format depends on mode(s)). Out/in-links are the API's {'ns', 'title'} link
+          entries, unless update_maps is True, when they are resolved to canonical page dictionaries with their
+          page IDs (red links marked 'missing'), as in earlier versions.
+    """
+    # Collect the full links of each type into the return dictionary
+    mode = link_modes(mode)
+    return_dict = {m: {} for m in mode}
+    async for m, b_links in aiter_links(wtsession, mode=mode, titles=titles, pageids=pageids,
+                                        pagemaps=pagemaps, namespaces=namespaces,
+                                        update_maps=update_maps, batchsize=batchsize):
+        return_dict[m].update(b_links)
     
     # Return the dictionary of links
     if len(return_dict) == 1:
@@ -199,6 +414,207 @@ async def get_links(wtsession, mode='out', titles=None, pageids=None, pagemaps=N
     else:
         return return_dict
 
+async def build_link_graph(wtsession, titles, mode='out', pagemaps=None, namespaces=[0], update_maps=False,
+                           batchsize=200, graph=None):
+    """Build a compact link graph of a list of articles from the API. The links of each batch of articles
+    are interned into the graph as soon as they arrive, so the full link dictionaries are never held.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        titles (list): The article titles to collect links for.
+        mode (str / list, optional): The kind of links to get, out and/or in. In-links are added as links to the article. Defaults to 'out'.
+        pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
+        namespaces (list, optional): The wiki namespaces to collect links from. Defaults to [0].
+        update_maps (bool, optional): Whether to resolve the linked pages' redirects with the maps. Defaults to False.
+        batchsize (int, optional): How many articles to collect links for before adding them to the graph. Defaults to 200.
+        graph (LinkGraph, optional): Graph to add the links to. Defaults to None (a new graph).
+
+    Raises:
+        ValueError: If a mode other than out or in is requested.
+
+    Returns:
+        LinkGraph: The link graph.
+    """
+    if any(m not in ['out', 'in'] for m in link_modes(mode)):
+        raise ValueError('Link graphs can only be built from out and in links')
+    if graph is None:
+        graph = LinkGraph()
+
+    async for m, b_links in aiter_links(wtsession, mode=mode, titles=titles, pagemaps=pagemaps,
+                                        namespaces=namespaces, update_maps=update_maps,
+                                        batchsize=batchsize):
+        for article, links in b_links.items():
+            graph.node(article)
+            if not links:
+                continue
+            if m == 'out':
+                graph.add_links(article, [l['title'] for l in links])
+            else:
+                for l in links:
+                    graph.add_links(l['title'], [article])
+    graph.build()
+    return graph
+
+async def crawl_links(wtsession, seeds, depth=1, max_nodes=None, mode='out', pagemaps=None, namespaces=[0],
+                      chunksize=200, parallel=4, checkpoint=None, checkpoint_every=10):
+    """Crawl the link graph breadth-first from a list of seed articles. Each page is fetched at most once, as
+    linked pages are resolved to their canonical titles before being added to the frontier. Pages of the next
+    layer are fetched as soon as they are found, while the rest of the current layer is still being collected.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        seeds (list): The article titles to start from.
+        depth (int, optional): Maximum number of hops from the seeds to fetch links for. Defaults to 1.
+        max_nodes (int, optional): Maximum number of pages to fetch links for. Defaults to None (no limit).
+        mode (str / list, optional): The links to follow, out and/or in. Defaults to 'out'.
+        pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
+        namespaces (list, optional): The wiki namespaces to collect links from. Defaults to [0].
+        chunksize (int, optional): Number of pages fetched together. Defaults to 200.
+        parallel (int, optional): Maximum number of chunks fetched at once. Defaults to 4.
+        checkpoint (str, optional): Path to save the crawl state to, and resume it from if it exists. Defaults to None.
+        checkpoint_every (int, optional): Number of chunks between checkpoints. Defaults to 10.
+
+    Raises:
+        ValueError: If a mode other than out or in is requested.
+
+    Returns:
+        LinkGraph: The crawled link graph.
+    """
+    modes = link_modes(mode)
+    if any(m not in ['out', 'in'] for m in modes):
+        raise ValueError('Can only crawl out and in links')
+    if pagemaps is None:
+        pagemaps = PageMaps()
+
+    # Pages waiting to be fetched are kept in a queue for each depth. If a shorter path to a waiting page is
+    # found, it is queued again at the lower depth and its entry in the deeper queue goes stale.
+    frontier = {}
+    queued = {}
+
+    def enqueue(title, d):
+        queued[title] = d
+        frontier.setdefault(d, deque()).append(title)
+
+    def next_depth():
+        # Get the shallowest depth with pages waiting, dropping stale entries
+        while frontier:
+            d = min(frontier)
+            q = frontier[d]
+            while q and (queued.get(q[0]) != d):
+                q.popleft()
+            if q:
+                return d
+            del frontier[d]
+        return None
+
+    # Resume from the checkpoint, or start from the canonical seed pages
+    if (checkpoint is not None) and os.path.exists(checkpoint):
+        with open(checkpoint, 'rb') as f:
+            state = pickle.load(f)
+        graph = state['graph']
+        for t, d in state['frontier']:
+            enqueue(t, d)
+        seen = state['seen']
+        n_fetched = state['n_fetched']
+    else:
+        if type(seeds) == str:
+            seeds = [seeds]
+        await pagemaps.fix_redirects(wtsession, titles=seeds)
+        seeds = process_articles(seeds, pagemaps=pagemaps)
+        graph = LinkGraph()
+        for t in seeds:
+            enqueue(t, 0)
+        seen = {t: 0 for t in seeds}
+        n_fetched = 0
+
+    async def fetch(chunk):
+        links = {}
+        async for m, b_links in aiter_links(wtsession, mode=modes, titles=[t for t, _ in chunk],
+                                            pagemaps=pagemaps, namespaces=namespaces, update_maps=True,
+                                            batchsize=len(chunk)):
+            links.setdefault(m, {}).update(b_links)
+        return links
+
+    def save():
+        # Pages being fetched go back on the frontier, to be fetched again on resuming
+        in_flight = [x for _, chunk in pending.values() for x in chunk]
+        waiting = sorted(queued.items(), key=lambda x: x[1])
+        graph.build()
+        with open(checkpoint + '.tmp', 'wb') as f:
+            pickle.dump({'graph': graph, 'frontier': in_flight + waiting, 'seen': seen,
+                         'n_fetched': n_fetched - len(in_flight)}, f)
+        os.replace(checkpoint + '.tmp', checkpoint)
+
+    pending = {}
+    n_chunks = 0
+    try:
+        while True:
+            # Fetch from the frontier while there are free slots, within the node budget. Pages at depth d+1
+            # wait while pages at depth d-1 or less are being fetched, so every page waiting to be fetched
+            # has its shortest depth by the time it is fetched.
+            while (len(pending) < parallel) and ((max_nodes is None) or (n_fetched < max_nodes)):
+                d = next_depth()
+                if (d is None) or (pending and (min(pd for pd, _ in pending.values()) < d - 1)):
+                    break
+                n = chunksize if max_nodes is None else min(chunksize, max_nodes - n_fetched)
+                chunk = []
+                q = frontier[d]
+                while q and (len(chunk) < n):
+                    t = q.popleft()
+                    if queued.get(t) == d:
+                        del queued[t]
+                        chunk.append((t, d))
+                n_fetched += len(chunk)
+                pending[asyncio.ensure_future(fetch(chunk))] = (d, chunk)
+            if not pending:
+                break
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                links = task.result()
+                _, chunk = pending.pop(task)
+                depths = dict(chunk)
+                for m, m_links in links.items():
+                    for article, a_links in m_links.items():
+                        graph.node(article)
+                        if not a_links:
+                            continue
+                        targets = [l['title'] for l in a_links]
+                        if m == 'out':
+                            graph.add_links(article, targets)
+                        else:
+                            for t in targets:
+                                graph.add_links(t, [article])
+                        # Add newly found pages to the frontier if they are within the depth limit, and move
+                        # waiting pages up if this is a shorter path to them
+                        if article not in depths:
+                            continue
+                        d = depths[article] + 1
+                        if d > depth:
+                            continue
+                        for l in a_links:
+                            t = l['title']
+                            if l.get('missing'):
+                                continue
+                            if t not in seen:
+                                seen[t] = d
+                                enqueue(t, d)
+                            elif (t in queued) and (d < queued[t]):
+                                seen[t] = d
+                                enqueue(t, d)
+                n_chunks += 1
+                if (checkpoint is not None) and (n_chunks % checkpoint_every == 0):
+                    save()
+    finally:
+        # Checkpoint on finishing, and on failing so the crawl can be resumed
+        if checkpoint is not None:
+            save()
+        for task in pending:
+            task.cancel()
+
+    graph.build()
+    return graph
+
 async def pipeline_get_links(project, user_agent, titles=None, pageids=None, pagemaps=None,
                              gl_args={'update_maps':True}, asynchronous=True, session_args={'formatversion':2}):
     """Runs full pipeline for getting links from the API - creating a session, collecting redirects, collecting links. Runs asynchronously.
@@ -1,14 +1,429 @@
+import asyncio
+import datetime
+import os
 from .tools import *
 from .redirects import *
 import mwapi
-from mwviews.api import PageviewsClient
-from mwviews import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
-def api_article_views(wtsession, project, articles, redirects=True, pagemaps=None,
+class PageviewMatrix:
+    """Pageviews of many articles on many dates, stored as an articles x dates NumPy matrix with
+    title and date index arrays. Much more compact than nested dictionaries, and can be saved to disk
+    and memory-mapped. Requires NumPy.
+
+    Args:
+        data (numpy.ndarray): Pageviews matrix, with a row for each title and a column for each date.
+        titles (list): The article titles.
+        dates (list): The dates.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+        ValueError: If the shape of the data does not match the titles and dates.
+    """
+    def __init__(self, data, titles, dates):
+        if np is None:
+            raise ImportError('NumPy is required for PageviewMatrix')
+        self.data = np.asarray(data)
+        self.titles = np.asarray(titles, dtype=str)
+        self.dates = np.asarray(dates, dtype='datetime64[h]')
+        if self.data.shape != (len(self.titles), len(self.dates)):
+            raise ValueError('Data shape %s does not match %d titles and %d dates'
+                             % (self.data.shape, len(self.titles), len(self.dates)))
+        self.index = None
+
+    @classmethod
+    def from_dict(cls, pageviews, dtype='int64', fill=0):
+        """Create a matrix from pageviews in the {date: {article: views}} format.
+
+        Args:
+            pageviews (dict): Pageviews of each article on each date.
+            dtype (str, optional): Integer type of the matrix, e.g. int32 to halve its size. Defaults to 'int64'.
+            fill (int, optional): Value for missing (None) pageviews. Defaults to 0.
+
+        Returns:
+            PageviewMatrix: The pageviews matrix.
+        """
+        dates = sorted(pageviews)
+        titles = list(dict.fromkeys(a for pv in pageviews.values() for a in pv))
+        ix = {a: i for i, a in enumerate(titles)}
+        data = np.empty((len(titles), len(dates)), dtype=dtype)
+        # Fill a whole date column at once
+        for j, date in enumerate(dates):
+            pv = pageviews[date]
+            data[:, j] = [fill if v is None else v for v in map(pv.get, titles)]
+        return cls(data, titles, dates)
+
+    def group(self, mapping):
+        """Sum the pageviews of titles that map to the same group, e.g. redirects and their canonical
+        article. Each title is mapped once, then the rows are summed with a vectorized group-by.
+        Negative (missing) pageviews count as 0.
+
+        Args:
+            mapping (dict): Group of each title. Titles not in the mapping, or mapped to None (e.g. missing
+              pages), are their own group.
+
+        Returns:
+            PageviewMatrix: The pageviews of each group, in order of first appearance.
+        """
+        groups = {}
+        inverse = np.array([groups.setdefault(mapping.get(a) or a, len(groups))
+                            for a in self.titles.tolist()], dtype=np.int64)
+        data = self.data
+        if (data < 0).any():
+            data = np.where(data < 0, 0, data)
+        # Sort the rows by group, then sum each run of rows
+        order = np.argsort(inverse, kind='stable')
+        starts = np.flatnonzero(np.r_[True, np.diff(inverse[order]) != 0]) if len(order) else order
+        grouped = np.add.reduceat(data[order], starts, axis=0) if len(order) else data[:0]
+        return PageviewMatrix(grouped, list(groups), self.dates)
+
+    def to_dict(self):
+        """Convert the matrix to pageviews in the {date: {article: views}} format.
+
+        Returns:
+            dict: Pageviews of each article on each date.
+        """
+        titles = self.titles.tolist()
+        return {date: dict(zip(titles, self.data[:, j].tolist()))
+                for j, date in enumerate(self.dates.astype('datetime64[us]').tolist())}
+
+    def to_pandas(self):
+        """Convert the matrix to a dates x titles pandas DataFrame, without copying the data.
+
+        Returns:
+            pandas.DataFrame: The pageviews.
+        """
+        import pandas as pd
+        return pd.DataFrame(self.data.T, index=pd.DatetimeIndex(self.dates), columns=self.titles,
+                            copy=False)
+
+    def save(self, path):
+        """Save the matrix to a directory of .npy files.
+
+        Args:
+            path (str): The directory to save to.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'data.npy'), self.data)
+        np.save(os.path.join(path, 'titles.npy'), self.titles)
+        np.save(os.path.join(path, 'dates.npy'), self.dates)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a matrix saved with save, memory-mapping the data so only the parts used are read.
+
+        Args:
+            path (str): The directory to load from.
+            mmap_mode (str, optional): numpy.load memory-map mode, or None to read the data into memory. Defaults to 'r'.
+
+        Returns:
+            PageviewMatrix: The pageviews matrix.
+        """
+        return cls(np.load(os.path.join(path, 'data.npy'), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, 'titles.npy')),
+                   np.load(os.path.join(path, 'dates.npy')))
+
+    def __getitem__(self, title):
+        """Get the pageviews of an article on each date."""
+        if self.index is None:
+            self.index = {a: i for i, a in enumerate(self.titles.tolist())}
+        return self.data[self.index[title]]
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __str__(self):
+        return f"PageviewMatrix of {len(self.titles)} articles x {len(self.dates)} dates"
+
+class PageviewCube:
+    """Pageviews of many articles on many dates, broken down by access method and agent type, stored as an
+    articles x dates x access methods x agents NumPy array. Requires NumPy.
+
+    Args:
+        data (numpy.ndarray): Pageviews array.
+        titles (list): The article titles.
+        dates (list): The dates.
+        accesses (list): The access methods.
+        agents (list): The agent types.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+        ValueError: If the shape of the data does not match the indexes.
+    """
+    def __init__(self, data, titles, dates, accesses, agents):
+        if np is None:
+            raise ImportError('NumPy is required for PageviewCube')
+        self.data = np.asarray(data)
+        self.titles = np.asarray(titles, dtype=str)
+        self.dates = np.asarray(dates, dtype='datetime64[h]')
+        self.accesses = list(accesses)
+        self.agents = list(agents)
+        shape = (len(self.titles), len(self.dates), len(self.accesses), len(self.agents))
+        if self.data.shape != shape:
+            raise ValueError('Data shape %s does not match indexes of shape %s' % (self.data.shape, shape))
+
+    @classmethod
+    def from_matrices(cls, matrices, dtype='int64'):
+        """Combine the pageview matrices of each access method and agent type.
+
+        Args:
+            matrices (dict): The PageviewMatrix of each (access, agent).
+            dtype (str, optional): Integer type of the array. Defaults to 'int64'.
+
+        Returns:
+            PageviewCube: The combined pageviews.
+        """
+        accesses = list(dict.fromkeys(k[0] for k in matrices))
+        agents = list(dict.fromkeys(k[1] for k in matrices))
+        titles = list(dict.fromkeys(t for m in matrices.values() for t in m.titles.tolist()))
+        dates = np.unique(np.concatenate([m.dates for m in matrices.values()]))
+        t_ix = {t: i for i, t in enumerate(titles)}
+        data = np.zeros((len(titles), len(dates), len(accesses), len(agents)), dtype=dtype)
+        for (access, agent), m in matrices.items():
+            rows = np.array([t_ix[t] for t in m.titles.tolist()], dtype=np.int64)
+            cols = np.searchsorted(dates, m.dates)
+            data[np.ix_(rows, cols, [accesses.index(access)], [agents.index(agent)])] = m.data[:, :, None, None]
+        return cls(data, titles, dates, accesses, agents)
+
+    def matrix(self, access, agent):
+        """Get the pageviews of one access method and agent type.
+
+        Args:
+            access (str): The access method.
+            agent (str): The agent type.
+
+        Returns:
+            PageviewMatrix: The pageviews.
+        """
+        return PageviewMatrix(self.data[:, :, self.accesses.index(access), self.agents.index(agent)],
+                              self.titles, self.dates)
+
+    def to_pandas(self):
+        """Convert the array to a pandas DataFrame with a row for each date and a column for each
+        (title, access, agent).
+
+        Returns:
+            pandas.DataFrame: The pageviews.
+        """
+        import pandas as pd
+        columns = pd.MultiIndex.from_product([self.titles, self.accesses, self.agents],
+                                             names=['title', 'access', 'agent'])
+        data = self.data.transpose(1, 0, 2, 3).reshape(len(self.dates), -1)
+        return pd.DataFrame(data, index=pd.DatetimeIndex(self.dates), columns=columns)
+
+    def __str__(self):
+        return (f"PageviewCube of {len(self.titles)} articles x {len(self.dates)} dates x "
+                f"{len(self.accesses)} access methods x {len(self.agents)} agents")
+
+class TopViewsTable:
+    """Columnar table of top viewed articles, with a (date, rank, title, views) row for each article on each
+    date, and an index from titles to their rows. Requires NumPy.
+
+    Args:
+        dates (list): The date of each row.
+        ranks (list): The rank of each row.
+        titles (list): The article title of each row.
+        views (list): The views of each row.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+    """
+    def __init__(self, dates, ranks, titles, views):
+        if np is None:
+            raise ImportError('NumPy is required for TopViewsTable')
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.ranks = np.asarray(ranks, dtype=np.int32)
+        self.titles = np.asarray(titles, dtype=str)
+        self.views = np.asarray(views, dtype=np.int64)
+        self.index = None
+
+    @classmethod
+    def from_top(cls, top):
+        """Create a table from the top articles of each date, as returned by the pageviews client.
+
+        Args:
+            top (dict): The top articles on each date.
+
+        Returns:
+            TopViewsTable: The table.
+        """
+        rows = [(date, x['rank'], x['article'].replace('_', ' '), x['views'])
+                for date, articles in sorted(top.items()) for x in articles]
+        if not rows:
+            return cls([], [], [], [])
+        return cls(*zip(*rows))
+
+    def build_index(self):
+        """Build the index from each title to its rows."""
+        order = np.argsort(self.titles, kind='stable')
+        titles, starts = np.unique(self.titles[order], return_index=True)
+        self.index = dict(zip(titles.tolist(), np.split(order, starts[1:])))
+
+    def rows(self, title):
+        """Get the rows of an article.
+
+        Args:
+            title (str): The article title.
+
+        Returns:
+            numpy.ndarray: The row numbers, in date order.
+        """
+        if self.index is None:
+            self.build_index()
+        return self.index.get(title, np.array([], dtype=np.int64))
+
+    def days(self, title, max_rank=None):
+        """Get the dates an article was in the top articles.
+
+        Args:
+            title (str): The article title.
+            max_rank (int, optional): Only include dates the article ranked at or above this. Defaults to None.
+
+        Returns:
+            numpy.ndarray: The dates.
+        """
+        rows = self.rows(title)
+        if max_rank is not None:
+            rows = rows[self.ranks[rows] <= max_rank]
+        return self.dates[rows]
+
+    def on(self, date):
+        """Get the top articles on a date.
+
+        Args:
+            date (str|date): The date.
+
+        Returns:
+            TopViewsTable: The rows of the date.
+        """
+        mask = self.dates == np.datetime64(date, 'D')
+        return TopViewsTable(self.dates[mask], self.ranks[mask], self.titles[mask], self.views[mask])
+
+    def to_pandas(self):
+        """Convert the table to a pandas DataFrame.
+
+        Returns:
+            pandas.DataFrame: The table, with date, rank, title and views columns.
+        """
+        import pandas as pd
+        return pd.DataFrame({'date': self.dates, 'rank': self.ranks, 'title': self.titles,
+                             'views': self.views})
+
+    def save(self, path):
+        """Save the table to a directory of .npy files.
+
+        Args:
+            path (str): The directory to save to.
+        """
+        os.makedirs(path, exist_ok=True)
+        for column in ['dates', 'ranks', 'titles', 'views']:
+            np.save(os.path.join(path, column + '.npy'), getattr(self, column))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load a table saved with save.
+
+        Args:
+            path (str): The directory to load from.
+            mmap_mode (str, optional): numpy.load memory-map mode, or None to read the data into memory. Defaults to 'r'.
+
+        Returns:
+            TopViewsTable: The table.
+        """
+        return cls(*[np.load(os.path.join(path, column + '.npy'), mmap_mode=mmap_mode)
+                     for column in ['dates', 'ranks', 'titles', 'views']])
+
+    def __len__(self):
+        return len(self.titles)
+
+    def __str__(self):
+        return f"TopViewsTable of {len(self.titles)} rows over {len(np.unique(self.dates))} dates"
+
+async def adaptive_article_views(wtsession, project, articles, access='all-access', agent='all-agents',
+                                 start=None, end=None, threshold=1):
+    """Get daily pageviews for articles adaptively: one monthly pass over all articles, then daily requests only
+    for the (article, month) cells with at least threshold views, or with no final monthly data yet (e.g. the
+    current month). Other days get 0 views, which is exact for the default threshold of 1.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        project (str): The wiki project.
+        articles (list): List of article titles to get pageviews for.
+        access (str, optional): access method (desktop, mobile-web, mobile-app, all-access). Defaults to 'all-access'.
+        agent (str, optional): user agent type (spider, user, bot, all-agents). Defaults to 'all-agents'.
+        start (str|date, optional): The start date to get pageviews from. Defaults to None (30 days before end).
+        end (str|date, optional): The end date to get pageviews to. Defaults to None (today).
+        threshold (int, optional): Minimum monthly views for daily views to be requested. Defaults to 1.
+
+    Returns:
+        dict: Daily pageviews of each article (with underscores), in the same format as the pageviews client.
+    """
+    end_date = pv_parse_date(end or datetime.date.today())
+    start_date = pv_parse_date(start) if start else end_date - datetime.timedelta(30)
+    if type(articles) is str:
+        articles = [articles]
+    articles = [a.replace(' ', '_') for a in articles]
+
+    # Monthly pass over the whole months covering the range
+    m_start = start_date.replace(day=1)
+    m_end = (end_date.replace(day=1) + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+    monthly = await wtsession.pv_client.article_views(project, articles, access, agent, 'monthly',
+                                                      m_start, m_end)
+
+    # The API leaves out months without views, so a month with no monthly data is quiet once it is final.
+    # Only the current month, or one still within the publication lag, is fetched daily.
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    final_before = today - datetime.timedelta(days=wtsession.pv_client.lag)
+
+    def quiet(a, month):
+        views = monthly.get(month, {}).get(a)
+        if views is None:
+            return (month + datetime.timedelta(days=32)).replace(day=1) <= final_before
+        return views < threshold
+
+    months = []
+    month = m_start
+    while month <= end_date:
+        months.append(month)
+        month = (month + datetime.timedelta(days=32)).replace(day=1)
+
+    # Days of quiet months get 0 views, the others are filled in by the daily requests
+    dates = pv_dates(start_date, end_date)
+    output = {date: {a: (0 if quiet(a, date.replace(day=1)) else None) for a in articles}
+              for date in dates}
+
+    # Group the articles by the runs of busy months they need daily data for
+    ranges = {}
+    for a in articles:
+        run = []
+        for month in months + [None]:
+            if (month is not None) and (not quiet(a, month)):
+                run.append(month)
+                continue
+            if run:
+                r_end = (run[-1] + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+                ranges.setdefault((max(run[0], start_date), min(r_end, end_date)), []).append(a)
+                run = []
+
+    # Daily requests for the busy cells only
+    results = await asyncio.gather(*[wtsession.pv_client.article_views(project, r_articles, access, agent,
+                                                                       'daily', r_start, r_end)
+                                     for (r_start, r_end), r_articles in ranges.items()])
+    for daily in results:
+        for date, pv in daily.items():
+            if date in output:
+                output[date].update(pv)
+    return output
+
+async def api_article_views(wtsession, project, articles, redirects=True, pagemaps=None,
                       access='all-access', agent='all-agents', granularity='daily',
-                      start=None, end=None, replace_nones=True, process=True):
-    """Get pageviews for articles from the mwviews API.
+                      start=None, end=None, replace_nones=True, process=True, as_matrix=False,
+                      dtype='int64', adaptive=False, threshold=1):
+    """Get pageviews for articles from the pageviews API.
 
     Args:
         wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
@@ -22,12 +437,18 @@ def api_article_views(wtsession, project, articles, redirects=True, pagemaps=Non
         start (str|date, optional): The start date to get pageviews from. Defaults to None.
         end (str|date, optional): The end date to get pageviews to. Defaults to None.
         replace_nones (bool, optional): Whether to replace None values (page not existing) with 0. Defaults to True.
+        as_matrix (bool, optional): Whether to return a PageviewMatrix instead of a dictionary. Missing pageviews are -1
+          in the matrix if replace_nones is False. Defaults to False.
+        dtype (str, optional): Integer type of the PageviewMatrix. Defaults to 'int64'.
+        adaptive (bool, optional): Whether to get daily pageviews with adaptive_article_views, only requesting daily
+          data for months with at least threshold views. Defaults to False.
+        threshold (int, optional): Minimum monthly views for daily views to be requested in adaptive mode. Defaults to 1.
 
     Raises:
         ValueError: Redirects requested but no norm_map or redirect_map provided.
 
     Returns:
-        dict: Pageviews for articles.
+        dict|PageviewMatrix: Pageviews for articles.
     """
 
     # Check if pagemaps are provided
@@ -40,28 +461,41 @@ def api_article_views(wtsession, project, articles, redirects=True, pagemaps=Non
     if process:
         articles = process_articles(articles, pagemaps=pagemaps)
     
-    # Get the article views using the mwviews client
-    rdpv = wtsession.pv_client.article_views(project, articles, access, agent, granularity,
-                                start, end)
+    # Get the article views concurrently using the session's pageviews client
+    if adaptive and (granularity == 'daily'):
+        rdpv = await adaptive_article_views(wtsession, project, articles, access, agent, start, end,
+                                            threshold=threshold)
+    else:
+        rdpv = await wtsession.pv_client.article_views(project, articles, access, agent, granularity,
+                                                       start, end)
 
     # If redirects are requested, group the pageviews by redirects
     if redirects:
+        # Resolve each title to its canonical title once
+        canonical = {}
+        for pv in rdpv.values():
+            for article in pv:
+                if article not in canonical:
+                    title = article.replace('_', ' ')
+                    # Titles whose canonical page is missing keep their own title
+                    canonical[article] = pagemaps.titles_redirect_map.get(title) or title
+
+        if np is not None:
+            grouped = PageviewMatrix.from_dict(rdpv, dtype=dtype).group(canonical)
+            return grouped if as_matrix else grouped.to_dict()
+
         grouped_rdpv = {}
         # Loop through dates
         for date, pv in rdpv.items():
-            # Sum values in pv based on reverse_existing_redirects
+            # Sum values in pv based on the canonical titles
             pv_grouped = {}
             for article, value in pv.items():
-                try:
-                    pv_grouped[pagemaps.titles_redirect_map.get(article.replace('_', ' '),
-                                                                article.replace('_', ' '))
-                               ] += int(value or 0)
-                except KeyError:
-                    pv_grouped[pagemaps.titles_redirect_map.get(article.replace('_', ' '),
-                                                                article.replace('_', ' '))
-                               ] = int(value or 0)
+                c = canonical[article]
+                pv_grouped[c] = pv_grouped.get(c, 0) + int(value or 0)
             grouped_rdpv[date] = pv_grouped
 
+        if as_matrix:
+            return PageviewMatrix.from_dict(grouped_rdpv, dtype=dtype)
         return grouped_rdpv
     else:
         if replace_nones:
@@ -71,12 +505,78 @@ def api_article_views(wtsession, project, articles, redirects=True, pagemaps=Non
         else:
             rdpv = {date: {art.replace('_', ' '): val for art, val in pv.items()}
                     for date, pv in rdpv.items()}
+        if as_matrix:
+            return PageviewMatrix.from_dict(rdpv, dtype=dtype, fill=0 if replace_nones else -1)
         return rdpv
-    
+
+async def api_article_views_breakdown(wtsession, project, articles, accesses=['desktop', 'mobile-web', 'mobile-app'],
+                                      agents=['user', 'spider', 'automated'], redirects=True, pagemaps=None,
+                                      granularity='daily', start=None, end=None, process=True, dtype='int64',
+                                      aav_args={}):
+    """Get pageviews for articles broken down by access method and agent type. Every combination is
+    fetched concurrently over the same session, with the titles processed once.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        project (str): The wiki project.
+        articles (list): List of article titles to get pageviews for.
+        accesses (list, optional): Access methods. Defaults to ['desktop', 'mobile-web', 'mobile-app'].
+        agents (list, optional): Agent types. Defaults to ['user', 'spider', 'automated'].
+        redirects (bool, optional): Whether to include redirects (and group pageviews by them). Defaults to True.
+        pagemaps (PageMaps, optional): The PageMaps object to map redirects with. Defaults to None.
+        granularity (str, optional): daily or monthly counts. Defaults to 'daily'.
+        start (str|date, optional): The start date to get pageviews from. Defaults to None.
+        end (str|date, optional): The end date to get pageviews to. Defaults to None.
+        process (bool, optional): Whether to normalise and resolve redirects of the titles first. Defaults to True.
+        dtype (str, optional): Integer type of the array. Defaults to 'int64'.
+        aav_args (dict, optional): Further arguments for api_article_views, e.g. adaptive. Defaults to {}.
+
+    Returns:
+        PageviewCube: Pageviews for articles, by access method and agent type.
+    """
+    if np is None:
+        raise ImportError('NumPy is required for api_article_views_breakdown')
+
+    # Check if pagemaps are provided
+    if not pagemaps:
+        if redirects:
+            print('Warning: Redirects requested but no pagemaps provided. Redirects will not be found and combined.')
+        pagemaps = PageMaps()
+
+    # Process the articles once for all combinations
+    if process:
+        articles = process_articles(articles, pagemaps=pagemaps)
+
+    combinations = [(access, agent) for access in accesses for agent in agents]
+    matrices = await asyncio.gather(*[api_article_views(wtsession, project, articles, redirects=redirects,
+                                                        pagemaps=pagemaps, access=access, agent=agent,
+                                                        granularity=granularity, start=start, end=end,
+                                                        process=False, as_matrix=True, dtype=dtype,
+                                                        **aav_args)
+                                      for access, agent in combinations])
+    return PageviewCube.from_matrices(dict(zip(combinations, matrices)), dtype=dtype)
+
+async def api_top_views(wtsession, project, access='all-access', granularity='daily', start=None, end=None):
+    """Get the most viewed articles of a project over a date range, as an indexed table.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        project (str): The wiki project.
+        access (str, optional): access method (desktop, mobile-web, mobile-app, all-access). Defaults to 'all-access'.
+        granularity (str, optional): daily or monthly lists. Defaults to 'daily'.
+        start (str|date, optional): The start date to get top articles from. Defaults to None.
+        end (str|date, optional): The end date to get top articles to. Defaults to None.
+
+    Returns:
+        TopViewsTable: The top articles on each date.
+    """
+    top = await wtsession.pv_client.top_articles(project, access, granularity, start, end)
+    return TopViewsTable.from_top(top)
+
 async def pipeline_api_article_views(project, user_agent, articles, pagemaps=None,
                                asynchronous=True, session_args={'formatversion':2},
-                               client_args={}, aav_args={}):
-    """Full process for getting pageviews for articles from the mwviews API. Resolves (and groups by) redirects and normalises titles.
+                               client_args={}, aav_args={}, store_path=None):
+    """Full process for getting pageviews for articles from the pageviews API. Resolves (and groups by) redirects and normalises titles.
 
     Args:
         project (str): The wiki project.
@@ -85,8 +585,10 @@ async def pipeline_api_article_views(project, user_agent, articles, pagemaps=Non
         pagemaps (PageMaps, optional): The PageMaps object to map redirects with. Defaults to None.
         asynchronous (bool, optional): Whether to use asynchronous pipeline. Defaults to True.
         session_args (dict, optional): Arguments for mwapi session. Defaults to {'formatversion':2}.
-        client_args (dict, optional): Arguments for mwviews client. Defaults to {}.
+        client_args (dict, optional): Arguments for the pageviews client. Defaults to {}.
         aav_args (dict, optional): Arguments for api_article_views. Defaults to {}.
+        store_path (str, optional): Path to a PageviewStore database, so that only dates not already stored are
+          requested. Defaults to None.
 
     Raises:
         ValueError: If synchronous pipeline is requested (not supported).
@@ -105,6 +607,11 @@ async def pipeline_api_article_views(project, user_agent, articles, pagemaps=Non
     # Construct the URL based on the project
     url = f'https://{project}.org'
 
+    # Open the pageview store, if any
+    store = PageviewStore(store_path) if store_path is not None else None
+    if store is not None:
+        client_args = {**client_args, 'store': store}
+
     # Create the session and client objects based on the asynchronous flag
     if asynchronous:
         wtsession = WTSession(project, user_agent, mw_session_args=session_args,
@@ -115,7 +622,6 @@ async def pipeline_api_article_views(project, user_agent, articles, pagemaps=Non
     # If asynchronous, fix redirects and get existing redirects
     if asynchronous:
         await pagemaps.get_redirects(wtsession, articles)
-        await wtsession.close()
     else:
         raise ValueError('Only async supported at present.')
     
@@ -124,8 +630,11 @@ async def pipeline_api_article_views(project, user_agent, articles, pagemaps=Non
     articles = [y for x in articles for y in pagemaps.collected_title_redirects[x]]
     
     # Call the api_article_views function to get the pageviews
-    pageviews = api_article_views(wtsession, project, articles, pagemaps=pagemaps,
-                                  process=False, **aav_args)
+    pageviews = await api_article_views(wtsession, project, articles, pagemaps=pagemaps,
+                                        process=False, **aav_args)
+    await wtsession.close()
+    if store is not None:
+        store.close()
     if rp:
         return pageviews, pagemaps
     else:
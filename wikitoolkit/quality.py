@@ -102,7 +102,8 @@ async def get_revisions_quality(wtsession, revids, lang, models='articlequality'
     for model in models:
         # Perform asynchronous query to get quality scores
         quals = await iterate_async_query(wtsession.lw_session, query_args_list, httpmethod='POST',
-                                          posturl=f'/service/lw/inference/v1/models/{model}:predict')
+                                          posturl=f'/service/lw/inference/v1/models/{model}:predict',
+                                          scheduler=wtsession.scheduler)
         
         # Parse the quality scores based on the model type
         if model == 'articlequality':
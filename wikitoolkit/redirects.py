@@ -25,10 +25,12 @@ async def basic_info(wtsession, titles=None, pageids=None, revids=None,
     query_list, key, ix = querylister(titles=titles, pageids=pageids,
                                            revids=revids, generator=False,
                                            pagemaps=pagemaps,
-                                           params=params)
+                                           params=params,
+                                           chunksize=await wtsession.get_title_limit())
 
     # Execute the async query and parse the data
-    data = await iterate_async_query(wtsession.mw_session, query_list, function, f_args=f_args, debug=debug)
+    data = await iterate_async_query(wtsession.mw_session, query_list, function, f_args=f_args, debug=debug,
+                                     scheduler=wtsession.scheduler)
 
     return data
 
@@ -45,6 +47,9 @@ async def parse_redirects(data):
     norms = {}
     ids = {}
     for page in await data:
+        # Portions without any pages (e.g. a generator that found no links) have no query
+        if 'query' not in page:
+            continue
         # Extract redirects from the API response
         redirects.update({x['from']: x['to']
                           for x in page['query'].get('redirects', {})})
@@ -84,10 +89,12 @@ async def fix_redirects(wtsession, titles=None, pageids=None, revids=None,
     query_list, key, ix = querylister(titles=titles, pageids=pageids,
                                         revids=revids, generator=False,
                                         pagemaps=pagemaps,
-                                        params={'redirects':''})
+                                        params={'redirects':''},
+                                        chunksize=await wtsession.get_title_limit())
 
     # Execute the async query and parse the data
-    data = await iterate_async_query(wtsession.mw_session, query_list, parse_redirects, debug=True)
+    data = await iterate_async_query(wtsession.mw_session, query_list, parse_redirects, debug=True,
+                                     scheduler=wtsession.scheduler)
 
     # Update the redirect map, norm map, and ID map with the extracted data
     await pagemaps.update_maps(wtsession, data)
@@ -146,10 +153,12 @@ async def get_redirects(wtsession, titles=None, pageids=None, revids=None,
     query_list, key, ix = querylister(titles=titles, pageids=pageids,
                                         revids=revids, generator=False,
                                         pagemaps=pagemaps,
-                                        params={'prop':'redirects', 'rdlimit': 'max'})
+                                        params={'prop':'redirects', 'rdlimit': 'max'},
+                                        chunksize=await wtsession.get_title_limit())
 
     # Execute the async query and parse the data
-    data = await iterate_async_query(wtsession.mw_session, query_list, parse_fetched_redirects, debug=False)
+    data = await iterate_async_query(wtsession.mw_session, query_list, parse_fetched_redirects, debug=False,
+                                     scheduler=wtsession.scheduler)
 
     # Update the collected redirects, redirect map, and ID map with the extracted data
     pagemaps.update_collected_redirect_maps(data)
@@ -161,9 +170,13 @@ async def get_redirects(wtsession, titles=None, pageids=None, revids=None,
 class PageMaps:
     """A class for fixing, collecting, and managing redirect and ID data.
     """
+    # Names of the maps, which are also the table names when backed by a SQLite store
+    map_names = ['titles_redirect_map', 'pageids_redirect_map', 'norm_map', 'id_map', 'revid_map',
+                 'collected_title_redirects', 'collected_pageid_redirects']
+
     def __init__(self, titles_redirect_map=None, pageids_redirect_map=None,
                  norm_map=None, id_map=None, revid_map=None, collected_title_redirects=None,
-                 collected_pageid_redirects=None):
+                 collected_pageid_redirects=None, store=None):
         """Initialise the PageMaps object.
 
         Args:
@@ -174,14 +187,24 @@ class PageMaps:
             revid_map (dict, optional): A dictionary of revision IDs to their canonical page IDs. Defaults to None.
             collected_title_redirects (dict, optional): A dictionary of canonical titles to all their redirects. Defaults to None.
             collected_pageid_redirects (dict, optional): A dictionary of canonical page IDs to all their redirect page IDs. Defaults to None.
+            store (str, optional): Path to a SQLite database to keep the maps in, instead of in memory. Maps
+              already in the database are reused, and any maps passed in are added to it. Defaults to None.
         """
-        self.titles_redirect_map = titles_redirect_map if titles_redirect_map is not None else {}
-        self.pageids_redirect_map = pageids_redirect_map if pageids_redirect_map is not None else {}
-        self.norm_map = norm_map if norm_map is not None else {}
-        self.id_map = id_map if id_map is not None else {}
-        self.revid_map = revid_map if revid_map is not None else {} # not really used
-        self.collected_title_redirects = collected_title_redirects if collected_title_redirects is not None else {}
-        self.collected_pageid_redirects = collected_pageid_redirects if collected_pageid_redirects is not None else {}
+        self.store = store
+        self.conn = connect_sqlite(store) if store is not None else None
+        maps = {'titles_redirect_map': titles_redirect_map, 'pageids_redirect_map': pageids_redirect_map,
+                'norm_map': norm_map, 'id_map': id_map, 'revid_map': revid_map, # revid_map not really used
+                'collected_title_redirects': collected_title_redirects,
+                'collected_pageid_redirects': collected_pageid_redirects}
+        for name, m in maps.items():
+            if self.conn is not None:
+                # Lookups go to the database lazily, updates are written in bulk
+                smap = SQLiteMap(self.conn, name)
+                if m:
+                    smap.update(m)
+                setattr(self, name, smap)
+            else:
+                setattr(self, name, m if m is not None else {})
 
     def filter_input(self, collected, titles=None, pageids=None, revids=None):
         """Filter the input titles or page IDs based on the already processed data.
@@ -293,10 +316,12 @@ class PageMaps:
         query_list, key, ix = querylister(titles=titles, pageids=pageids,
                                             revids=revids, generator=False,
                                             pagemaps=self,
-                                            params={'redirects':''})
+                                            params={'redirects':''},
+                                            chunksize=await wtsession.get_title_limit())
 
         # Execute the async query and parse the data
-        data = await iterate_async_query(wtsession.mw_session, query_list, parse_redirects, debug=True)
+        data = await iterate_async_query(wtsession.mw_session, query_list, parse_redirects, debug=True,
+                                         scheduler=wtsession.scheduler)
         await self.update_maps(wtsession, data)
         
     async def get_redirects(self, wtsession, titles=None, pageids=None, revids=None):
@@ -326,10 +351,12 @@ class PageMaps:
         query_list, key, ix = querylister(titles=titles, pageids=pageids,
                                     revids=revids, generator=False,
                                     pagemaps=self,
-                                    params={'prop':'redirects', 'rdlimit': 'max'})
+                                    params={'prop':'redirects', 'rdlimit': 'max'},
+                                    chunksize=await wtsession.get_title_limit())
 
         # Execute the async query and parse the data
-        data = await iterate_async_query(wtsession.mw_session, query_list, parse_fetched_redirects, debug=False)
+        data = await iterate_async_query(wtsession.mw_session, query_list, parse_fetched_redirects, debug=False,
+                                         scheduler=wtsession.scheduler)
 
         # Update the collected redirects, redirect map, and ID map with the extracted data
         await self.update_collected_redirect_maps(data)
@@ -355,10 +382,11 @@ class PageMaps:
         """
         #untested
         with open(path, 'wb') as f:
-            pickle.dump(self.return_maps(), f)
+            pickle.dump({k: dict(v.items()) for k, v in self.return_maps().items()}, f)
 
     def load_maps(self, path):
-        """Reads the page maps from a file.
+        """Reads the page maps from a file. If the maps are backed by a SQLite store, they are replaced
+        in the store.
 
         Args:
             path (str): File path to read the maps from.
@@ -366,13 +394,18 @@ class PageMaps:
         #untested
         with open(path, 'rb') as f:
             data = pickle.load(f)
-        self.titles_redirect_map = data['titles_redirect_map']
-        self.pageids_redirect_map = data['pageids_redirect_map']
-        self.norm_map = data['norm_map']
-        self.id_map = data['id_map']
-        self.collected_title_redirects = data['collected_title_redirects']
-        self.collected_pageid_redirects = data['collected_pageid_redirects']
-    
+        for name, m in data.items():
+            if self.conn is not None:
+                getattr(self, name).clear()
+                getattr(self, name).update(m)
+            else:
+                setattr(self, name, m)
+
+    def close(self):
+        """Close the SQLite store, if the maps are backed by one."""
+        if self.conn is not None:
+            self.conn.close()
+
     def __str__(self):
         """Return a string representation of the PageMaps object.
 
@@ -1,8 +1,15 @@
+import asyncio
+import bisect
 import datetime
+from array import array
 import mwapi
 from .tools import chunks
 from .api import *
 from .redirects import *
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 async def parse_revision(data):
     """Parse single revision data from the API.
@@ -15,7 +22,10 @@ async def parse_revision(data):
     """
     rev_info = {}
     for page in await data:
-        rev_info[(page['pageid'], page['title'])] = page.get('revisions', [None])[0]
+        k = (page.get('pageid'), page['title'])
+        # Pages can be repeated without their revision in continued batches
+        if ('revisions' in page) or (k not in rev_info):
+            rev_info[k] = page.get('revisions', [None])[0]
     return rev_info
 
 async def get_revision(session, titles=None, pageids=None, date=None,
@@ -25,9 +35,9 @@ async def get_revision(session, titles=None, pageids=None, date=None,
 
     Args:
         session (wikitoolkit.WTSession): The wikitoolkit session manager.
-        titles (list, optional): Article titles. Defaul ts to None.
+        titles (list, optional): Article titles. Defaults to None.
         pageids (list, optional): Page IDs. Defaults to None.
-        date (str): Date to retrieve revision for. Defaults to None.
+        date (str): Date to retrieve revision for. Defaults to None (latest revision).
         pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
         props (list, optional): Revision properties to collect. Defaults to ['timestamp', 'ids', 'content'].
         return_props (list, optional): Revision properties to return. Defaults to None.
@@ -44,20 +54,19 @@ async def get_revision(session, titles=None, pageids=None, date=None,
         print('Warning: No PageMaps object provided, this is not recommended practice') # TODO: make this a proper warning
         pagemaps = PageMaps()    
 
-    # Set default date if not provided
-    if not date:
-        date = datetime.datetime.now().isoformat()                   
-    
-    # Set query parameters
-    params = {'prop': 'revisions', 'rvdir': 'older',
-         'rvstart': date, 'rvlimit': 1, 'rvslots': 'main',
-         'rvprop': '|'.join(props)}
+    # Set query parameters. Without a date, the API returns the latest revision of many pages per query.
+    # Revisions as of a date can only be queried one page at a time.
+    params = {'prop': 'revisions', 'rvslots': 'main', 'rvprop': '|'.join(props)}
+    if date:
+        params.update({'rvdir': 'older', 'rvstart': date, 'rvlimit': 1})
 
-    query_args_list, key, ix = querylister(titles, pageids, generator=True,
-                pagemaps=pagemaps, params=params)
+    query_args_list, key, ix = querylister(titles, pageids, generator=bool(date),
+                pagemaps=pagemaps, params=params,
+                chunksize=None if date else await session.get_title_limit())
 
     # Execute the API query and parse the revision data
-    data = await iterate_async_query(session.mw_session, query_args_list, function=parse_revision, continuation=False)
+    data = await iterate_async_query(session.mw_session, query_args_list, function=parse_revision,
+                                     continuation=not date, scheduler=session.scheduler)
     
     # Organize the revision data based on titles or pageids
     if titles:
@@ -74,11 +83,105 @@ async def get_revision(session, titles=None, pageids=None, date=None,
 
     return revision
 
-async def parse_revisions(data):
+class RevisionTable:
+    """Columnar table of revision metadata, with int64 pageid, revid, parentid and size columns, a datetime64
+    timestamp column and a dictionary-encoded user column. Revisions are added to pending buffers as they are
+    parsed, and build() converts them to the column arrays. Missing values are -1 (NaT for timestamps).
+    Requires NumPy.
+
+    Args:
+        columns (dict, optional): Array of each column. Defaults to None.
+        users (list, optional): The user names the user column codes refer to. Defaults to None.
+        titles (dict, optional): The title of each page ID. Defaults to None.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+    """
+    dtypes = {'pageid': 'int64', 'revid': 'int64', 'parentid': 'int64', 'timestamp': 'datetime64[s]',
+              'size': 'int64', 'user': 'int32'}
+
+    def __init__(self, columns=None, users=None, titles=None):
+        if np is None:
+            raise ImportError('NumPy is required for RevisionTable')
+        self.columns = {c: np.asarray(columns[c], dtype=t) if columns is not None else np.zeros(0, dtype=t)
+                        for c, t in self.dtypes.items()}
+        self.users = list(users) if users is not None else []
+        self.user_ids = {u: i for i, u in enumerate(self.users)}
+        self.titles = dict(titles) if titles is not None else {}
+        self.pending = {c: array('q') for c in self.dtypes}
+
+    def add_revisions(self, pageid, title, revisions):
+        """Add the revisions of a page to the pending buffers.
+
+        Args:
+            pageid (int): The page ID.
+            title (str): The page title.
+            revisions (list): Revisions data from the API.
+        """
+        self.titles[pageid] = title
+        self.pending['pageid'].extend([pageid]*len(revisions))
+        for c in ['revid', 'parentid', 'size']:
+            self.pending[c].extend([r.get(c, -1) for r in revisions])
+        # Parse the timestamps of the page at once
+        timestamps = np.array([r.get('timestamp', 'NaT').rstrip('Z') for r in revisions], dtype='datetime64[s]')
+        self.pending['timestamp'].frombytes(timestamps.astype(np.int64).tobytes())
+        for r in revisions:
+            user = r.get('user')
+            if user is None:
+                self.pending['user'].append(-1)
+                continue
+            i = self.user_ids.get(user)
+            if i is None:
+                i = self.user_ids[user] = len(self.users)
+                self.users.append(user)
+            self.pending['user'].append(i)
+
+    def build(self):
+        """Append the pending revisions to the column arrays."""
+        for c, t in self.dtypes.items():
+            pending = np.frombuffer(self.pending[c], dtype=np.int64) if len(self.pending[c]) else np.zeros(0, np.int64)
+            self.columns[c] = np.concatenate([self.columns[c], pending.astype(t)])
+            self.pending[c] = array('q')
+
+    def __getitem__(self, column):
+        self.build()
+        return self.columns[column]
+
+    def to_pandas(self):
+        """Convert the table to a pandas DataFrame, with the title and user columns as categoricals.
+
+        Returns:
+            pandas.DataFrame: The table.
+        """
+        import pandas as pd
+        self.build()
+        df = pd.DataFrame({c: v for c, v in self.columns.items() if c != 'user'})
+        df.insert(1, 'title', df['pageid'].map(self.titles).astype('category'))
+        df['user'] = pd.Categorical.from_codes(self.columns['user'], categories=self.users)
+        return df
+
+    def to_parquet(self, path, **kwargs):
+        """Save the table to a Parquet file, with the title and user columns dictionary-encoded.
+        Requires pandas and a Parquet engine (pyarrow or fastparquet).
+
+        Args:
+            path (str): The file to save to.
+            **kwargs: Other arguments for pandas.DataFrame.to_parquet.
+        """
+        self.to_pandas().to_parquet(path, index=False, **kwargs)
+
+    def __len__(self):
+        return len(self.columns['revid']) + len(self.pending['revid'])
+
+    def __str__(self):
+        return f"RevisionTable of {len(self)} revisions of {len(self.titles)} pages by {len(self.users)} users"
+
+async def parse_revisions(data, table=None):
     """Parse revisions from the API.
 
     Args:
         data (list): Data from the API.
+        table (RevisionTable, optional): Table to add the revisions to instead of returning them. Defaults to None.
 
     Returns:
         dict: revisions data.
@@ -87,6 +190,9 @@ async def parse_revisions(data):
     for page in await data:
         if ('pageid' not in page) | ('title' not in page):
             continue
+        if table is not None:
+            table.add_revisions(page['pageid'], page['title'], page.get('revisions', []))
+            continue
         if (page['pageid'], page['title']) in revisions:
             revisions[(page['pageid'], page['title'])].extend(page.get('revisions', []))
         else:
@@ -94,8 +200,121 @@ async def parse_revisions(data):
 
     return revisions
 
+def rv_timestamp(date):
+    """Format a date as an API revision timestamp.
+
+    Args:
+        date (str / datetime.datetime): The date.
+
+    Returns:
+        str: The timestamp, in the form YYYY-MM-DDTHH:MM:SSZ.
+    """
+    if type(date) == str:
+        date = datetime.datetime.fromisoformat(date.replace('Z', ''))
+    elif type(date) == datetime.date:
+        date = datetime.datetime.combine(date, datetime.time())
+    return date.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+async def probe_revisions_window(wtsession, query_args, start, stop, max_windows=16):
+    """Get the first portion of the revisions of a page between two dates, and split the rest of the range into
+    windows if there are more. The probe's revision rate is used to size the windows at about one query's worth of
+    revisions each.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        query_args (dict): The revisions query arguments for a single page.
+        start (str): Start timestamp.
+        stop (str): Stop timestamp.
+        max_windows (int, optional): Maximum number of windows to split the rest of the range into. Defaults to 16.
+
+    Returns:
+        tuple: Revisions data of the first portion, and the (start, stop) of each window left to fetch.
+    """
+    session = wtsession.mw_session
+    params = {**query_args, 'rvstart': start, 'rvend': stop}
+    portion = await query_async(session, params, continuation=False, debug=True,
+                                scheduler=wtsession.scheduler, host=session_host(session))
+
+    revisions = {}
+    for page in portion.get('query', {}).get('pages', []):
+        if ('pageid' in page) and ('title' in page):
+            revisions.setdefault((page['pageid'], page['title']), []).extend(page.get('revisions', []))
+    if ('continue' not in portion) or (len(revisions) != 1):
+        return revisions, []
+    (k, probe), = revisions.items()
+    if not probe:
+        return revisions, []
+
+    # Estimate how many windows the rest of the range needs from the revision rate of the probe
+    t0 = datetime.datetime.strptime(start, '%Y-%m-%dT%H:%M:%SZ')
+    t1 = datetime.datetime.strptime(stop, '%Y-%m-%dT%H:%M:%SZ')
+    last = datetime.datetime.strptime(probe[-1]['timestamp'], '%Y-%m-%dT%H:%M:%SZ')
+    span = (last - t0).total_seconds()
+    rest = (t1 - last).total_seconds()
+    if (span <= 0) or (rest <= 0):
+        # The range can't be split any further by date, so follow the continuation serially
+        data = await iterate_async_query(session, [params], function=parse_revisions,
+                                         scheduler=wtsession.scheduler)
+        return data[0], []
+    n = int(min(max_windows, rest, max(2, -(-rest // span))))
+
+    # Window edges are inclusive, so revisions on a boundary are fetched twice and dropped when merging
+    edges = [rv_timestamp(last + datetime.timedelta(seconds=rest*i/n)) for i in range(n)] + [stop]
+    return revisions, [(edges[i], edges[i+1]) for i in range(n)]
+
+async def get_revisions_windows(wtsession, query_args_list, start, stop, max_windows=16):
+    """Get the revisions of pages between two dates, splitting the dates into windows that are fetched concurrently
+    for pages with many revisions. Each window is probed with probe_revisions_window, so busy periods are split
+    further. The windows of each round of splitting are run through the session's scheduler.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        query_args_list (list): The revisions query arguments for each page.
+        start (str): Start timestamp.
+        stop (str): Stop timestamp.
+        max_windows (int, optional): Maximum number of windows to split each range into at a time. Defaults to 16.
+
+    Returns:
+        list: Revisions data of each page, in order and without duplicates.
+    """
+    # The revisions of each page are collected in pieces, keyed by the start of the window they came from
+    pieces = [{} for _ in query_args_list]
+    keys = [None for _ in query_args_list]
+    windows = [(i, start, stop) for i in range(len(query_args_list))]
+
+    async def probe(window):
+        i, w_start, w_stop = window
+        return await probe_revisions_window(wtsession, query_args_list[i], w_start, w_stop, max_windows)
+
+    while windows:
+        split = []
+        async for j, (revisions, sub_windows) in wtsession.scheduler.imap(probe, windows):
+            i, w_start, _ = windows[j]
+            for k, v in revisions.items():
+                keys[i] = k
+                pieces[i][w_start] = v
+            split.extend((i, s, e) for s, e in sub_windows)
+        windows = split
+
+    # Merge the pieces of each page in order, dropping the revisions fetched twice on window boundaries
+    data = []
+    for k, page_pieces in zip(keys, pieces):
+        if k is None:
+            data.append({})
+            continue
+        seen = set()
+        merged = []
+        for w_start in sorted(page_pieces):
+            for r in page_pieces[w_start]:
+                if r['revid'] not in seen:
+                    seen.add(r['revid'])
+                    merged.append(r)
+        data.append({k: merged})
+    return data
+
 async def get_revisions(wtsession, titles=None, pageids=None, start=None, stop=None,
-                  pagemaps=None, props=['timestamp', 'ids']):
+                  pagemaps=None, props=['timestamp', 'ids'], max_windows=None,
+                  columnar=False):
     """Get revisions for a page between two dates.
 
     Args:
@@ -106,9 +325,13 @@ async def get_revisions(wtsession, titles=None, pageids=None, start=None, stop=N
         stop (str): Stop date. Defaults to None.
         pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
         props (list, optional): Revision properties to collect. Defaults to ['timestamp', 'ids'].
+        max_windows (int, optional): If given, the histories of pages with many revisions are split into up to this
+          many date windows at a time, fetched concurrently. Defaults to None (each page's revisions are continued
+          serially).
+        columnar (bool, optional): Whether to return the revisions as a RevisionTable, built while parsing. Defaults to False.
     
     Returns:
-        dict: Revisions data.
+        dict|RevisionTable: Revisions data.
     """
     # Check if titles or pageids are provided
     if not (bool(titles) ^ bool(pageids)):
@@ -137,7 +360,20 @@ async def get_revisions(wtsession, titles=None, pageids=None, start=None, stop=N
                 pagemaps=pagemaps, params=params)
 
     # Execute the API query and parse the revision data
-    data = await iterate_async_query(wtsession.mw_session, query_args_list, function=parse_revisions, debug=False)
+    table = RevisionTable() if columnar else None
+    if max_windows:
+        data = await get_revisions_windows(wtsession, query_args_list, rv_timestamp(start), rv_timestamp(stop),
+                                           max_windows)
+        if columnar:
+            for d in data:
+                for k, v in d.items():
+                    table.add_revisions(k[0], k[1], v)
+    else:
+        data = await iterate_async_query(wtsession.mw_session, query_args_list, function=parse_revisions,
+                                         f_args=[table], debug=False, scheduler=wtsession.scheduler)
+    if columnar:
+        table.build()
+        return table
 
     # Organize the revision data based on titles or pageids
     if titles:
@@ -147,6 +383,67 @@ async def get_revisions(wtsession, titles=None, pageids=None, start=None, stop=N
     
     return revisions
 
+async def get_revision_snapshots(wtsession, dates, titles=None, pageids=None, pagemaps=None,
+                                 props=['timestamp', 'ids']):
+    """Get the revision of each page as of each of many dates, e.g. monthly snapshots. Instead of one query per page
+    and date, the lightweight metadata of each page's revisions over the whole span is fetched once, along with the
+    revision as of the first date, and the revision as of each date is then found locally by binary search.
+
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        dates (list): Dates to retrieve revisions for.
+        titles (list, optional): Article titles. Defaults to None.
+        pageids (list, optional): Page IDs. Defaults to None.
+        pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
+        props (list, optional): Revision properties to collect. Properties other than timestamp and ids are only
+          fetched for the snapshot revisions. Defaults to ['timestamp', 'ids'].
+
+    Raises:
+        ValueError: If titles and pageids are not specified or if both are specified.
+
+    Returns:
+        dict: Revision data as of each date (None before the page was created) for each page.
+    """
+    # Check if titles or pageids are provided
+    if not (bool(titles) ^ bool(pageids)):
+        raise ValueError('Must specify exactly one of title or pageid')
+
+    # Check if pagemaps is provided
+    if pagemaps is None:
+        print('Warning: No PageMaps object provided, this is not recommended practice') # TODO: make this a proper warning
+        pagemaps = PageMaps()
+
+    timestamps = {d: rv_timestamp(d) for d in dates}
+    first, last = min(timestamps.values()), max(timestamps.values())
+    meta_props = ['timestamp', 'ids']
+
+    # Fetch the revision as of the first date and the metadata of all revisions up to the last date
+    initial, revisions = await asyncio.gather(
+        get_revision(wtsession, titles=titles, pageids=pageids, date=first, pagemaps=pagemaps, props=meta_props),
+        get_revisions(wtsession, titles=titles, pageids=pageids, start=first, stop=last, pagemaps=pagemaps,
+                      props=meta_props))
+
+    # Find the revision as of each date by binary search over the revision timestamps
+    snapshots = {}
+    for page, revision in initial.items():
+        page_revisions = ([revision] if revision else []) + [r for r in revisions.get(page, [])
+                                                              if (not revision) or (r['revid'] != revision['revid'])]
+        page_timestamps = [r['timestamp'] for r in page_revisions]
+        snapshots[page] = {}
+        for d, ts in timestamps.items():
+            i = bisect.bisect_right(page_timestamps, ts)
+            snapshots[page][d] = page_revisions[i-1] if i else None
+
+    # Fetch any other properties for the snapshot revisions only
+    if set(props) - set(meta_props):
+        revids = list({r['revid'] for v in snapshots.values() for r in v.values() if r})
+        data = await get_revisions_data(wtsession, revids, pagemaps=pagemaps, props=props) if revids else {}
+        snapshots = {page: {d: dict(data.get(r['revid'], r), revid=r['revid']) if r else None
+                            for d, r in v.items()}
+                     for page, v in snapshots.items()}
+
+    return snapshots
+
 async def parse_revisions_data(data):
     """Parse revisions data from the API.
 
@@ -184,9 +481,11 @@ async def get_revisions_data(wtsession, revids, pagemaps=None, props=['timestamp
     
     params = {'prop': 'revisions', 'rvslots': 'main', 'rvprop': '|'.join(props)}
     query_args_list, key, ix = querylister(revids=revids, pagemaps=pagemaps,
-                                           params=params)
+                                           params=params,
+                                           chunksize=await wtsession.get_title_limit())
 
-    data = await iterate_async_query(wtsession.mw_session, query_args_list, function=parse_revisions_data, debug=False)
+    data = await iterate_async_query(wtsession.mw_session, query_args_list, function=parse_revisions_data, debug=False,
+                                     scheduler=wtsession.scheduler)
     revisions_data = {k:v for d in data for k, v in d.items()}
 
     return revisions_data
@@ -206,15 +505,18 @@ async def parse_revisions_content(data):
                                 for x in page['revisions']})
     return revisions_content
 
-async def get_revisions_content(wtsession, revids, pagemaps=None):
-    """Get revision content for a list of revision IDs.
+async def aiter_revisions_content(wtsession, revids, pagemaps=None, ordered=False, store=None):
+    """Stream revision content for a list of revision IDs, yielding each batch as soon as it arrives.
 
     Args:
         wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
         revids (list): The revision IDs to collect data for.
         pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
-    Returns:
-        dict: The content of the revisions.
+        ordered (bool, optional): Whether to yield batches in submission order rather than completion order. Defaults to False.
+        store (RevisionStore, optional): Store to look up content in before querying the API, and to save fetched content to. Defaults to None.
+
+    Yields:
+        dict: The content of a batch of revisions.
     """
     # Check if pagemaps is provided
     if pagemaps is None:
@@ -224,17 +526,49 @@ async def get_revisions_content(wtsession, revids, pagemaps=None):
     # Check if revids is a single value and convert it to a list
     if (type(revids) == int) | (type(revids) == str):
         revids = [revids]                 
+
+    # Pass on stored content first, and only fetch the rest
+    if store is not None:
+        missing = store.missing(revids)
+        missing_set = set(missing)
+        stored = [x for x in dict.fromkeys(int(r) for r in revids) if x not in missing_set]
+        for chunk in chunks(stored, 500):
+            yield store.get_many(chunk)
+        revids = missing
+        if not revids:
+            return
     
     # Construct the query arguments list for each chunk of revids
     params = {'prop': 'revisions', 'rvslots': 'main', 'rvprop': 'ids|content'}
     query_args_list, key, ix = querylister(revids=revids, pagemaps=pagemaps,
-                                           params=params)    
+                                           params=params,
+                                           chunksize=await wtsession.get_title_limit())
+
+    # Execute the API query and parse the revisions content as each batch completes
+    async for revisions_content in aiter_async_query(wtsession.mw_session, query_args_list,
+                                                     function=parse_revisions_content,
+                                                     scheduler=wtsession.scheduler,
+                                                     ordered=ordered):
+        if store is not None:
+            store.put_many(revisions_content)
+        yield revisions_content
+
+async def get_revisions_content(wtsession, revids, pagemaps=None, store=None):
+    """Get revision content for a list of revision IDs.
 
-    # Execute the API query and parse the revisions content
-    data = await iterate_async_query(wtsession.mw_session, query_args_list, function=parse_revisions_content, debug=False)
-    
+    Args:
+        wtsession (wikitoolkit.WTSession): The wikitoolkit session manager.
+        revids (list): The revision IDs to collect data for.
+        pagemaps (wikitools.PageMap, optional): PageMap object to track redirects. Defaults to None.
+        store (RevisionStore, optional): Store to look up content in before querying the API, and to save fetched content to. Defaults to None.
+    Returns:
+        dict: The content of the revisions.
+    """
     # Combine the revisions content from different chunks into a single dictionary
-    revisions_content = {k:v for d in data for k, v in d.items()}
+    revisions_content = {}
+    async for d in aiter_revisions_content(wtsession, revids, pagemaps=pagemaps, ordered=True,
+                                           store=store):
+        revisions_content.update(d)
 
     return revisions_content
 
@@ -248,7 +582,7 @@ async def pipeline_revisions(project, user_agent, mode, titles=None, pageids=Non
     Args:
         project (str): The Wikimedia project to query.
         user_agent (str): The user agent string to use.
-        mode (str): The mode to use for collecting revisions. Must be one of 'single', 'range', 'data', or 'content'.
+        mode (str): The mode to use for collecting revisions. Must be one of 'single', 'range', 'snapshots', 'data', or 'content'.
         titles (list, optional): The article titles to collect revision data for. Must specify exactly one of titles or pageids or revisions. Defaults to None.
         pageids (list, optional): The article IDs to collect revision data for. Must specify exactly one of titles or pageids or revisions. Defaults to None.
         revids (list, optional): The revisions IDs to collect revision data for. Must specify exactly one of titles or pageids or revisions. Defaults to None.
@@ -278,7 +612,7 @@ async def pipeline_revisions(project, user_agent, mode, titles=None, pageids=Non
         raise ValueError('Only async supported at present.')
         wtsession = mwapi.Session(url, user_agent=user_agent, **session_args)
 
-    mode_dict = {'single': get_revision, 'range': get_revisions,
+    mode_dict = {'single': get_revision, 'range': get_revisions, 'snapshots': get_revision_snapshots,
             'data':get_revisions_data, 'content': get_revisions_content}
 
     # Perform necessary operations if asynchronous is True
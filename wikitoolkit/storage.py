@@ -0,0 +1,528 @@
+import datetime
+import json
+import os
+import sqlite3
+import time
+import urllib.parse
+import zlib
+from collections.abc import MutableMapping, ValuesView
+
+# Default time to live for cached responses of each kind of endpoint, in seconds. None never expires.
+DEFAULT_TTLS = {'revisions': None, # revisions requested by revision ID never change
+                'pageviews': None, # pageviews for past days never change
+                'pageviews_recent': 3600, # pageviews including today may still be updated
+                'redirects': 6*3600,
+                'default': 24*3600}
+
+def connect_sqlite(path, readonly=False):
+    """Open a SQLite database for use by the wikitoolkit stores.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        readonly (bool, optional): Whether to open an existing database read-only, e.g. for lookups
+          from worker processes. Defaults to False.
+
+    Returns:
+        sqlite3.Connection: The database connection.
+    """
+    if readonly:
+        uri = 'file:%s?mode=ro' % urllib.parse.quote(os.path.abspath(path))
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    # Write-ahead logging lets other processes read while we write
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+class ResponseCache:
+    """Persistent on-disk cache of API responses, backed by SQLite. Responses are keyed on their
+    normalised request parameters, expire after a time to live that depends on the endpoint, and the
+    least recently used responses are evicted when the cache grows beyond its size cap.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        max_size (int, optional): Maximum total size of the (compressed) cached responses, in bytes. Defaults to 2**30 (1GB).
+        ttls (dict, optional): Time to live for each kind of endpoint, in seconds, overriding DEFAULT_TTLS. Defaults to {}.
+    """
+    def __init__(self, path, max_size=2**30, ttls={}):
+        self.path = path
+        self.max_size = max_size
+        self.ttls = {**DEFAULT_TTLS, **ttls}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Access times of cache hits, written with the next set or flush
+        self.accessed = {}
+        self.conn = connect_sqlite(path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS responses
+                             (key TEXT PRIMARY KEY, value BLOB, size INTEGER,
+                              expires REAL, accessed REAL)''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def key(*parts):
+        """Create a cache key from the parts of a request.
+
+        Args:
+            *parts: The parts identifying the request, e.g. host, HTTP method and normalised parameters.
+
+        Returns:
+            str: The cache key.
+        """
+        return json.dumps(parts, sort_keys=True, default=str)
+
+    def endpoint(self, params):
+        """Classify a MediaWiki API request by the kind of data it returns.
+
+        Args:
+            params (dict): The normalised request parameters.
+
+        Returns:
+            str: The kind of endpoint, one of the keys of ttls.
+        """
+        props = str(params.get('prop', '')).split('|')
+        # Only revisions alone are permanent, other props of the same pages can change
+        if ('revids' in params) and (params.get('prop') == 'revisions'):
+            return 'revisions'
+        if ('redirects' in params) or ('redirects' in props):
+            return 'redirects'
+        return 'default'
+
+    def ttl(self, params):
+        """Get the time to live for a MediaWiki API request.
+
+        Args:
+            params (dict): The normalised request parameters.
+
+        Returns:
+            float: The time to live in seconds, or None if the response never expires.
+        """
+        return self.ttls[self.endpoint(params)]
+
+    def get(self, key):
+        """Look up a response in the cache.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            tuple: Whether the response was found, and the response.
+        """
+        row = self.conn.execute('SELECT value, size, expires FROM responses WHERE key = ?',
+                                (key,)).fetchone()
+        now = time.time()
+        if row is None:
+            self.misses += 1
+            return False, None
+        value, size, expires = row
+        if (expires is not None) and (expires < now):
+            # Drop expired responses
+            self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.conn.commit()
+            self.accessed.pop(key, None)
+            self.size -= size
+            self.misses += 1
+            return False, None
+        self.accessed[key] = now
+        self.hits += 1
+        return True, json.loads(zlib.decompress(value))
+
+    def set(self, key, value, ttl=None):
+        """Store a response in the cache, evicting the least recently used responses if it is full.
+
+        Args:
+            key (str): The cache key.
+            value: The (JSON serialisable) response.
+            ttl (float, optional): Time to live in seconds. Defaults to None (never expires).
+        """
+        blob = zlib.compress(json.dumps(value).encode('utf-8'))
+        now = time.time()
+        expires = now + ttl if ttl is not None else None
+        old = self.conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+        self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                          (key, blob, len(blob), expires, now))
+        self.size += len(blob) - (old[0] if old else 0)
+        self.accessed.pop(key, None)
+        self.evict()
+        self.conn.commit()
+
+    def flush(self, commit=True):
+        """Write the access times of cache hits to the database.
+
+        Args:
+            commit (bool, optional): Whether to commit the write. Defaults to True.
+        """
+        if self.accessed:
+            self.conn.executemany('UPDATE responses SET accessed = ? WHERE key = ?',
+                                  [(t, k) for k, t in self.accessed.items()])
+            self.accessed = {}
+            if commit:
+                self.conn.commit()
+
+    def evict(self):
+        """Evict the least recently used responses until the cache is within its size cap."""
+        # Access times must be up to date to find the least recently used responses
+        self.flush(commit=False)
+        while self.size > self.max_size:
+            rows = self.conn.execute('SELECT key, size FROM responses ORDER BY accessed LIMIT 100').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.size <= self.max_size:
+                    break
+                self.conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.size -= size
+                self.evictions += 1
+
+    def clear(self):
+        """Remove all responses from the cache."""
+        self.conn.execute('DELETE FROM responses')
+        self.conn.commit()
+        self.accessed = {}
+        self.size = 0
+
+    def stats(self):
+        """Get cache usage statistics.
+
+        Returns:
+            dict: Hits, misses, evictions, number of entries and total size in bytes.
+        """
+        entries = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': entries, 'size': self.size}
+
+    def close(self):
+        """Write any pending access times and close the database connection."""
+        self.flush()
+        self.conn.close()
+
+    def __str__(self):
+        return f"ResponseCache at {self.path}: {self.hits} hits, {self.misses} misses, {self.size} bytes"
+
+class RevisionStore:
+    """Persistent store of revision content keyed by revision ID, backed by a SQLite blob table.
+    Revision content never changes once saved, so stored content never expires.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        compression (int, optional): zlib compression level for the stored content. Defaults to 6.
+    """
+    def __init__(self, path, compression=6):
+        self.path = path
+        self.compression = compression
+        self.conn = connect_sqlite(path)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS revisions (revid INTEGER PRIMARY KEY, content BLOB)')
+        self.conn.commit()
+
+    def get_many(self, revids):
+        """Get the stored content for a list of revision IDs.
+
+        Args:
+            revids (list): The revision IDs.
+
+        Returns:
+            dict: The content of each revision found in the store.
+        """
+        content = {}
+        revids = [int(x) for x in revids]
+        # Stay within SQLite's limit on query parameters
+        for chunk in range(0, len(revids), 500):
+            ids = revids[chunk:chunk+500]
+            rows = self.conn.execute('SELECT revid, content FROM revisions WHERE revid IN (%s)'
+                                     % ','.join('?'*len(ids)), ids)
+            content.update({revid: zlib.decompress(blob).decode('utf-8') for revid, blob in rows})
+        return content
+
+    def put_many(self, content):
+        """Store the content of revisions.
+
+        Args:
+            content (dict): The content of each revision, keyed by revision ID.
+        """
+        self.conn.executemany('INSERT OR REPLACE INTO revisions VALUES (?, ?)',
+                              [(int(k), zlib.compress(v.encode('utf-8'), self.compression))
+                               for k, v in content.items() if v is not None])
+        self.conn.commit()
+
+    def missing(self, revids):
+        """Find the revision IDs that are not in the store.
+
+        Args:
+            revids (list): The revision IDs.
+
+        Returns:
+            list: The revision IDs without stored content.
+        """
+        revids = list(dict.fromkeys(int(x) for x in revids))
+        found = set()
+        for chunk in range(0, len(revids), 500):
+            ids = revids[chunk:chunk+500]
+            found.update(x for x, in self.conn.execute('SELECT revid FROM revisions WHERE revid IN (%s)'
+                                                       % ','.join('?'*len(ids)), ids))
+        return [x for x in revids if x not in found]
+
+    def __getitem__(self, revid):
+        row = self.conn.execute('SELECT content FROM revisions WHERE revid = ?', (int(revid),)).fetchone()
+        if row is None:
+            raise KeyError(revid)
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def __contains__(self, revid):
+        return self.conn.execute('SELECT 1 FROM revisions WHERE revid = ?', (int(revid),)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM revisions').fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+
+    def __str__(self):
+        return f"RevisionStore at {self.path}: {len(self)} revisions"
+
+class SQLiteValuesView(ValuesView):
+    """Values view of a SQLiteMap, with membership tests run as indexed lookups."""
+    def __contains__(self, value):
+        return self._mapping.has_value(value)
+
+class SQLiteMap(MutableMapping):
+    """Dictionary-like map stored in a SQLite table. Lookups are made lazily and updates are
+    written in bulk, so maps much larger than memory can be used wherever a dict is expected.
+    Keys and values must be JSON serialisable.
+
+    Args:
+        conn (sqlite3.Connection): The database connection.
+        table (str): Name of the table to store the map in.
+    """
+    def __init__(self, conn, table):
+        if not table.isidentifier():
+            raise ValueError('Invalid table name: %s' % table)
+        self.conn = conn
+        self.table = table
+        self.conn.execute('CREATE TABLE IF NOT EXISTS %s (key TEXT PRIMARY KEY, value TEXT)' % table)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS %s_value ON %s (value)' % (table, table))
+        self.conn.commit()
+
+    def __getitem__(self, key):
+        row = self.conn.execute('SELECT value FROM %s WHERE key = ?' % self.table,
+                                (json.dumps(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO %s VALUES (?, ?)' % self.table,
+                          (json.dumps(key), json.dumps(value)))
+        self.conn.commit()
+
+    def __delitem__(self, key):
+        cur = self.conn.execute('DELETE FROM %s WHERE key = ?' % self.table, (json.dumps(key),))
+        self.conn.commit()
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for key, in self.conn.execute('SELECT key FROM %s' % self.table).fetchall():
+            yield json.loads(key)
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM %s' % self.table).fetchone()[0]
+
+    def __contains__(self, key):
+        return self.conn.execute('SELECT 1 FROM %s WHERE key = ?' % self.table,
+                                 (json.dumps(key),)).fetchone() is not None
+
+    def has_value(self, value):
+        """Check whether any key maps to a value.
+
+        Args:
+            value: The value to look for.
+
+        Returns:
+            bool: Whether the value is in the map.
+        """
+        return self.conn.execute('SELECT 1 FROM %s WHERE value = ? LIMIT 1' % self.table,
+                                 (json.dumps(value),)).fetchone() is not None
+
+    def values(self):
+        return SQLiteValuesView(self)
+
+    def items(self):
+        return [(json.loads(k), json.loads(v))
+                for k, v in self.conn.execute('SELECT key, value FROM %s' % self.table)]
+
+    def iter_items(self, by_value=False):
+        """Stream the items of the map from the database, without loading them all at once.
+
+        Args:
+            by_value (bool, optional): Whether to order the items by value, so equal values are adjacent. Defaults to False.
+
+        Yields:
+            tuple: Key and value.
+        """
+        query = 'SELECT key, value FROM %s' % self.table
+        if by_value:
+            query += ' ORDER BY value'
+        for k, v in self.conn.execute(query):
+            yield json.loads(k), json.loads(v)
+
+    def update(self, other=(), **kwargs):
+        """Insert or replace many items at once, in a single transaction.
+
+        Args:
+            other (dict|iterable, optional): Mapping or iterable of (key, value) pairs. Defaults to ().
+            **kwargs: Further items.
+        """
+        pairs = other.items() if hasattr(other, 'items') else other
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO %s VALUES (?, ?)' % self.table,
+                                  ((json.dumps(k), json.dumps(v)) for k, v in pairs))
+            if kwargs:
+                self.conn.executemany('INSERT OR REPLACE INTO %s VALUES (?, ?)' % self.table,
+                                      ((json.dumps(k), json.dumps(v)) for k, v in kwargs.items()))
+
+    def clear(self):
+        """Remove all items from the map."""
+        with self.conn:
+            self.conn.execute('DELETE FROM %s' % self.table)
+
+class PageviewStore:
+    """Persistent store of pageview time series, backed by SQLite. The dates held for each article are
+    recorded, so only the missing dates need to be fetched. Only final pageviews are stored: dates that
+    have ended, and missing (None) pageviews only once the data for them should have been published.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        lag (int, optional): Number of days after which missing pageviews are taken to be final. Defaults to 3.
+    """
+    def __init__(self, path, lag=3):
+        self.path = path
+        self.lag = lag
+        self.conn = connect_sqlite(path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS pageviews
+                             (project TEXT, access TEXT, agent TEXT, granularity TEXT, article TEXT,
+                              date TEXT, views INTEGER,
+                              PRIMARY KEY (project, access, agent, granularity, article, date))
+                             WITHOUT ROWID''')
+        self.conn.commit()
+
+    def is_final(self, date, views, granularity):
+        """Check whether pageviews for a date will no longer change.
+
+        Args:
+            date (datetime.datetime): The date.
+            views (int): The pageviews, or None if missing.
+            granularity (str): hourly, daily or monthly counts.
+
+        Returns:
+            bool: Whether the pageviews are final.
+        """
+        if granularity == 'hourly':
+            period_end = date + datetime.timedelta(hours=1)
+        elif granularity == 'monthly':
+            period_end = (date.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            period_end = date + datetime.timedelta(days=1)
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        if views is None:
+            return period_end <= today - datetime.timedelta(days=self.lag)
+        return period_end <= today
+
+    def rows(self, project, articles, dates, access, agent, granularity):
+        """Get the stored pageviews of articles within a date range.
+
+        Args:
+            project (str): The wiki project.
+            articles (list): Article titles (with underscores).
+            dates (list): The dates, in order.
+            access (str): access method.
+            agent (str): user agent type.
+            granularity (str): hourly, daily or monthly counts.
+
+        Yields:
+            tuple: Article, date (YYYYMMDDHH), views.
+        """
+        if not dates:
+            return
+        start, end = dates[0].strftime('%Y%m%d%H'), dates[-1].strftime('%Y%m%d%H')
+        articles = list(articles)
+        # Stay within SQLite's limit on query parameters
+        for chunk in range(0, len(articles), 500):
+            arts = articles[chunk:chunk+500]
+            yield from self.conn.execute('''SELECT article, date, views FROM pageviews
+                                            WHERE project = ? AND access = ? AND agent = ? AND granularity = ?
+                                            AND date BETWEEN ? AND ? AND article IN (%s)'''
+                                         % ','.join('?'*len(arts)),
+                                         [project, access, agent, granularity, start, end] + arts)
+
+    def get(self, project, articles, dates, access='all-access', agent='all-agents', granularity='daily'):
+        """Get the stored pageviews of articles.
+
+        Args:
+            project (str): The wiki project.
+            articles (list): Article titles (with underscores).
+            dates (list): The dates, in order.
+            access (str, optional): access method. Defaults to 'all-access'.
+            agent (str, optional): user agent type. Defaults to 'all-agents'.
+            granularity (str, optional): hourly, daily or monthly counts. Defaults to 'daily'.
+
+        Returns:
+            dict: Stored pageviews of each article on each date.
+        """
+        pageviews = {}
+        for article, date, views in self.rows(project, articles, dates, access, agent, granularity):
+            pageviews.setdefault(datetime.datetime.strptime(date, '%Y%m%d%H'), {})[article] = views
+        return pageviews
+
+    def missing(self, project, articles, dates, access='all-access', agent='all-agents', granularity='daily'):
+        """Find the dates each article has no stored pageviews for.
+
+        Args:
+            project (str): The wiki project.
+            articles (list): Article titles (with underscores).
+            dates (list): The dates, in order.
+            access (str, optional): access method. Defaults to 'all-access'.
+            agent (str, optional): user agent type. Defaults to 'all-agents'.
+            granularity (str, optional): hourly, daily or monthly counts. Defaults to 'daily'.
+
+        Returns:
+            dict: The missing dates of each article with any.
+        """
+        held = {}
+        for article, date, _ in self.rows(project, articles, dates, access, agent, granularity):
+            held.setdefault(article, set()).add(date)
+        missing = {}
+        keys = [d.strftime('%Y%m%d%H') for d in dates]
+        for article in articles:
+            a_held = held.get(article, set())
+            a_missing = [d for d, k in zip(dates, keys) if k not in a_held]
+            if a_missing:
+                missing[article] = a_missing
+        return missing
+
+    def put(self, project, pageviews, access='all-access', agent='all-agents', granularity='daily'):
+        """Store the final pageviews of articles.
+
+        Args:
+            project (str): The wiki project.
+            pageviews (dict): Pageviews of each article (with underscores) on each date.
+            access (str, optional): access method. Defaults to 'all-access'.
+            agent (str, optional): user agent type. Defaults to 'all-agents'.
+            granularity (str, optional): hourly, daily or monthly counts. Defaults to 'daily'.
+        """
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO pageviews VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  ((project, access, agent, granularity, article, date.strftime('%Y%m%d%H'), views)
+                                   for date, pv in pageviews.items()
+                                   for article, views in pv.items()
+                                   if self.is_final(date, views, granularity)))
+
+    def close(self):
+        """Close the database connection."""
+        self.conn.close()
+
+    def __str__(self):
+        count = self.conn.execute('SELECT COUNT(*) FROM pageviews').fetchone()[0]
+        return f"PageviewStore at {self.path}: {count} pageviews"
@@ -1,4 +1,5 @@
 from math import log10, floor
+from urllib.parse import quote
 
 def round_sig(x, sig=2):
     """Rounds a number to a given number of significant figures.
@@ -31,6 +32,33 @@ def chunks(l, n):
         # Create an index range for l of n items:
         yield l[i:i+n]
 
+def length_chunks(l, n, maxlen, sep='|'):
+    """Split list l into a list of lists of at most n items, keeping the URL-encoded length of each joined sublist within maxlen.
+
+    Args:
+        l (list): Initial list.
+        n (int): Maximum sublist size.
+        maxlen (int): Maximum URL-encoded length of each sublist, joined with sep.
+        sep (str, optional): Separator the sublists will be joined with. Defaults to '|'.
+
+    Yields:
+        list: Subsequent sublists.
+    """
+    sep_len = len(quote(sep, safe=''))
+    chunk = []
+    size = 0
+    for x in l:
+        x_len = len(quote(str(x), safe=''))
+        # Start a new sublist if this one is full or would get too long
+        if chunk and ((len(chunk) >= n) or (size + sep_len + x_len > maxlen)):
+            yield chunk
+            chunk = []
+            size = 0
+        size += x_len + (sep_len if chunk else 0)
+        chunk.append(x)
+    if chunk:
+        yield chunk
+
 def process_articles(titles=None, pageids=None, pagemaps=None):
     """Process article titles or pageids. Runs normalisation and redirects.
 
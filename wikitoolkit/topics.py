@@ -44,7 +44,8 @@ async def get_articles_topics(wtsession, titles=None, revids=None, pagemaps=None
         
         # Perform the asynchronous query to get topics
         topics = await iterate_async_query(wtsession.lw_session, query_args_list, httpmethod='POST',
-                                           posturl=f'/service/lw/inference/v1/models/{model}:predict')
+                                           posturl=f'/service/lw/inference/v1/models/{model}:predict',
+                                           scheduler=wtsession.scheduler)
         
         # Process the results into a dictionary
         topics = {x['prediction']['article'].split('wikipedia.org/wiki/')[1].replace('_', ' '):
@@ -59,7 +60,8 @@ async def get_articles_topics(wtsession, titles=None, revids=None, pagemaps=None
         
         # Perform the asynchronous query to get topics
         topics = await iterate_async_query(wtsession.lw_session, query_args_list, httpmethod='POST',
-                                           posturl=f'/service/lw/inference/v1/models/{model}:predict')
+                                           posturl=f'/service/lw/inference/v1/models/{model}:predict',
+                                           scheduler=wtsession.scheduler)
         
         # Process the results into a dictionary
         topics = {int(list(x[model.split('-')[0]]['scores'].keys())[0]):